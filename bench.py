@@ -0,0 +1,273 @@
+"""Benchmarks for the engine's search and evaluation hot paths.
+
+Runs a fixed corpus of opening, middle-game and endgame positions and
+reports nodes searched, nodes/sec, time to each depth and memory per
+node, plus raw speed of the evaluation and win-check functions and a
+fixed-depth search of the empty board on larger geometries. Results
+are compared with a stored baseline and regressions beyond a threshold
+are flagged. Only node counts and chosen moves, which do not depend on
+the machine's load, set the exit status (1) unless --timings is given:
+
+    python bench.py                     # compare with bench_baseline.json
+    python bench.py --timings           # also fail on time and memory
+    python bench.py --update-baseline   # store this run as the baseline
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from batch_eval import get_batch_evaluator
+from engine import DEFAULT_GEOMETRY, Position, SearchEngine, get_geometry, score_position
+from mcts import playout
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# Positions as 1-based column sequences, with the search depth cap per phase
+CORPUS = {
+    "opening": (9, ["", "44", "426532", "64767352"]),
+    "midgame": (9, [
+        "676434565235",
+        "62527417364416",
+        "6273433723443527",
+        "765722432234576234",
+    ]),
+    "endgame": (42, [
+        "73213575225514157734522161",
+        "7773247453366247513573366445",
+        "316657646674227157454547217614",
+        "67264476244456174752516165172223",
+    ]),
+}
+
+# Board geometries (rows, cols, connect) searched from the empty board, and the depth cap
+GEOMETRIES = {
+    "7x6": (6, 7, 4),
+    "8x7": (7, 8, 4),
+    "9x7": (7, 9, 4),
+}
+GEOMETRY_DEPTH = 8
+
+# Metrics where a larger value is worse; everything else is "higher is better"
+LOWER_IS_BETTER = ("nodes", "time_ms", "peak_bytes_per_node", "ns_per_call")
+
+# Metrics that are the same on every run; the rest only count with --timings
+DETERMINISTIC = ("move", "nodes")
+
+# Searches faster than this are too short to time; their timings are not compared
+TIMING_FLOOR_MS = 5.0
+
+
+def position_from_moves(moves: str) -> Position:
+    """Build a position from a 1-based column sequence."""
+    position = Position()
+    for ch in moves:
+        position.play(int(ch) - 1)
+    return position
+
+
+def bench_search(tt_size_mb: float, repeat: int = 1) -> Dict[str, Dict]:
+    """Search every corpus position from a fresh engine.
+
+    Timings are the best of `repeat` runs; node counts are deterministic.
+    """
+    results = {}
+    for phase, (depth, games) in CORPUS.items():
+        for moves in games:
+            position = position_from_moves(moves)
+            elapsed = math.inf
+            for _ in range(repeat):
+                engine = SearchEngine(tt_size_mb)
+                gc.collect()
+                start = time.perf_counter()
+                result = engine.search(position, depth)
+                elapsed = min(elapsed, time.perf_counter() - start)
+                iterations = engine.iterations
+
+            # Memory is measured in a second, traced run so it does not skew timings
+            engine = SearchEngine(tt_size_mb)
+            tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+            engine.search(position, depth)
+            peak = tracemalloc.get_traced_memory()[1] - base
+            tracemalloc.stop()
+
+            nodes = max(1, result.nodes)
+            results[f"{phase}:{moves or '-'}"] = {
+                "move": result.move,
+                "depth": result.depth,
+                "nodes": result.nodes,
+                "time_ms": elapsed * 1000,
+                "nodes_per_sec": nodes / elapsed if elapsed else 0.0,
+                "time_to_depth_ms": {str(it.depth): round(it.elapsed_ms, 3) for it in iterations},
+                "peak_bytes_per_node": peak / nodes,
+            }
+    return results
+
+
+def bench_geometries(tt_size_mb: float, repeat: int = 1) -> Dict[str, Dict]:
+    """Search the empty board of each geometry to a fixed depth."""
+    results = {}
+    for name, shape in GEOMETRIES.items():
+        position = Position(get_geometry(*shape))
+        elapsed = math.inf
+        for _ in range(repeat):
+            engine = SearchEngine(tt_size_mb)
+            gc.collect()
+            start = time.perf_counter()
+            result = engine.search(position, GEOMETRY_DEPTH)
+            elapsed = min(elapsed, time.perf_counter() - start)
+        results[name] = {
+            "move": result.move,
+            "depth": result.depth,
+            "nodes": result.nodes,
+            "time_ms": elapsed * 1000,
+            "nodes_per_sec": result.nodes / elapsed if elapsed else 0.0,
+        }
+    return results
+
+
+def time_calls(func, args_list: List[tuple], min_seconds: float = 0.2) -> float:
+    """Average nanoseconds per call over repeated passes of args_list."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for args in args_list:
+            func(*args)
+        calls += len(args_list)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed * 1e9 / calls
+
+
+def bench_hot_paths() -> Dict[str, Dict]:
+    """Per-call cost of the evaluation, win check, make/unmake and an MCTS playout.
+
+    evaluate_batch is the batch evaluator's cost per position, scoring the
+    whole corpus in one call (NumPy makes it several times faster).
+    """
+    positions = [position_from_moves(moves) for _, games in CORPUS.values() for moves in games]
+
+    def play_undo(position, col):
+        position.play(col)
+        position.undo()
+
+    moves = [(p, c) for p in positions for c in p.legal_moves()]
+    rng = random.Random(0)
+    evaluator = get_batch_evaluator(DEFAULT_GEOMETRY)
+    return {
+        "score_position": {"ns_per_call": time_calls(score_position, [(p, p.current) for p in positions])},
+        "has_four": {"ns_per_call": time_calls(DEFAULT_GEOMETRY.has_line, [(p.boards[0],) for p in positions])},
+        "play_undo": {"ns_per_call": time_calls(play_undo, moves)},
+        "legal_moves": {"ns_per_call": time_calls(Position.legal_moves, [(p,) for p in positions])},
+        "evaluate_batch": {"ns_per_call": time_calls(evaluator.evaluate_positions, [(positions,)]) / len(positions)},
+        "playout": {"ns_per_call": time_calls(playout, [(p.boards, p.mask, p.moves, p.geometry, rng) for p in positions])},
+    }
+
+
+def run_benchmarks(tt_size_mb: float, repeat: int = 1) -> Dict:
+    """Run every benchmark and return the results in baseline form."""
+    return {
+        "python": sys.version.split()[0],
+        "search": bench_search(tt_size_mb, repeat),
+        "geometry": bench_geometries(tt_size_mb, repeat),
+        "hot_paths": bench_hot_paths(),
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float, timings: bool = False) -> List[str]:
+    """List metrics that got worse than the baseline by more than threshold.
+
+    A changed move counts as a regression. Time and memory metrics are
+    only compared when timings is set, and timings of searches that took
+    less than TIMING_FLOOR_MS are never compared.
+    """
+    regressions = []
+    for section in ("search", "geometry", "hot_paths"):
+        for name, metrics in current[section].items():
+            old = baseline.get(section, {}).get(name)
+            if old is None:
+                continue
+            too_short = min(metrics.get("time_ms", math.inf), old.get("time_ms", math.inf)) < TIMING_FLOOR_MS
+            for metric, value in metrics.items():
+                before = old.get(metric)
+                if metric == "depth" or metric not in DETERMINISTIC and (not timings or too_short):
+                    continue
+                if metric == "move":
+                    if before is not None and value != before:
+                        regressions.append(f"{section}/{name} move: {before} -> {value}")
+                    continue
+                if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                    continue
+                change = (value - before) / before
+                worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+                if worse:
+                    regressions.append(f"{section}/{name} {metric}: {before:.6g} -> {value:.6g} ({change:+.1%})")
+    return regressions
+
+
+def print_report(results: Dict, out=sys.stdout):
+    """Human-readable summary of a run."""
+    print(f"{'position':44} {'depth':>5} {'nodes':>9} {'ms':>9} {'nodes/s':>9} {'B/node':>8}", file=out)
+    for name, m in results["search"].items():
+        print(f"{name:44} {m['depth']:>5} {m['nodes']:>9} {m['time_ms']:>9.1f} "
+              f"{m['nodes_per_sec']:>9.0f} {m['peak_bytes_per_node']:>8.1f}", file=out)
+    print(file=out)
+    for name, m in results["geometry"].items():
+        print(f"{'empty ' + name:44} {m['depth']:>5} {m['nodes']:>9} {m['time_ms']:>9.1f} "
+              f"{m['nodes_per_sec']:>9.0f}", file=out)
+    print(file=out)
+    for name, m in results["hot_paths"].items():
+        print(f"{name:44} {m['ns_per_call']:>9.0f} ns/call", file=out)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point; returns the exit status."""
+    parser = argparse.ArgumentParser(description="Benchmark the Four in a Row engine.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--output", help="also write this run's results to a JSON file")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per position (best is kept)")
+    parser.add_argument("--timings", action="store_true",
+                        help="also count time and memory regressions, not just node counts and moves")
+    parser.add_argument("--tt-mb", type=float, default=16, help="transposition table size in MB")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.tt_mb, args.repeat)
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.timings)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions above {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
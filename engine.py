@@ -0,0 +1,1521 @@
+"""Headless Four in a Row engine.
+
+Positions, game rules and the AI search, with no GUI dependency, so the
+engine can be benchmarked, batched or served without a display. Importing
+this module only builds a few constant tables.
+
+Public rule functions take rows counted from the top, the way the board
+is drawn; bitboards store row 0 at the bottom.
+"""
+
+import json
+import math
+import os
+import random
+import time
+from array import array
+from typing import Optional, List, Tuple, NamedTuple
+
+# Standard board. Other sizes and win lengths get their own Geometry.
+ROWS = 6
+COLS = 7
+CONNECT = 4
+PLAYERS = ("red", "yellow")
+WIN_SCORE = 10_000_000_000
+# Scores beyond this are wins or losses a known number of plies away
+WIN_THRESHOLD = WIN_SCORE - 1000
+
+# Transposition table bound types
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+# Difficulty -> (depth cap, time budget per move in milliseconds)
+DIFFICULTY_LIMITS = {
+    "easy": (2, 150),
+    "medium": (5, 500),
+    "hard": (20, 1500),
+    "mcts": (42, 1500),
+}
+
+# Search backends by name (see make_engine), and difficulties that do not use alpha-beta
+BACKENDS = ("alphabeta", "mcts")
+DIFFICULTY_BACKENDS = {"mcts": "mcts"}
+
+
+class EvalWeights(NamedTuple):
+    """Integer weights of the evaluation; see evaluate_window."""
+    four: int = 100
+    three: int = 5
+    two: int = 2
+    opponent_three: int = -4
+    # Bonus per piece in a center column
+    center: int = 3
+
+
+DEFAULT_WEIGHTS = EvalWeights()
+# Tuned weights written by tune.py, loaded at import when present
+DEFAULT_WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights.json")
+
+
+def load_weights(path: str = DEFAULT_WEIGHTS_PATH) -> EvalWeights:
+    """Read evaluation weights from a JSON file, or the defaults if it is missing or invalid.
+
+    Fields missing from the file keep their default values.
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        return DEFAULT_WEIGHTS._replace(**{field: int(data[field]) for field in EvalWeights._fields if field in data})
+    except (OSError, ValueError, TypeError, AttributeError):
+        return DEFAULT_WEIGHTS
+
+
+WEIGHTS = load_weights()
+
+
+def evaluate_window(player_count: int, opponent_count: int, connect: int = CONNECT,
+                    weights: Optional[EvalWeights] = None) -> int:
+    """Evaluate one window of `connect` cells from the player's point of view."""
+    w = weights or WEIGHTS
+    score = 0
+    empty_count = connect - player_count - opponent_count
+
+    if player_count == connect:
+        score += w.four
+    elif player_count == connect - 1 and empty_count == 1:
+        score += w.three
+    elif player_count == connect - 2 and empty_count == 2:
+        score += w.two
+
+    if opponent_count == connect - 1 and empty_count == 1:
+        score += w.opponent_three
+
+    return score
+
+
+class Geometry:
+    """Board size, win length and every table derived from them.
+
+    Bitboards give each column rows + 1 bits, bottom row first; the spare
+    top bit stops shifts from wrapping into the next column. Use
+    get_geometry() so each geometry's tables are built only once.
+    """
+
+    def __init__(self, rows: int, cols: int, connect: int, weights: Optional[EvalWeights] = None):
+        if rows < 1 or cols < 1 or connect < 2 or connect > max(rows, cols):
+            raise ValueError(f"Unsupported geometry: {cols}x{rows}, connect {connect}")
+        if cols > 62:
+            raise ValueError("Transposition table moves fit at most 62 columns")
+        self.rows = rows
+        self.cols = cols
+        self.connect = connect
+        self.weights = weights = weights or WEIGHTS
+        self.h1 = h1 = rows + 1
+        self.cells = rows * cols
+        # Position keys fit a signed 64-bit table slot; larger ones are kept whole
+        self.exact_keys = cols * h1 <= 63
+        self.bottom_mask = [1 << (c * h1) for c in range(cols)]
+        # Bit of each cell's mirror image in the left-right reflection, by bit index
+        self.mirror_bits = tuple(1 << ((cols - 1 - index // h1) * h1 + index % h1) for index in range(cols * h1))
+        self.top_mask = [1 << (c * h1 + rows - 1) for c in range(cols)]
+        self.column_mask = [((1 << rows) - 1) << (c * h1) for c in range(cols)]
+        self.bottom_row = sum(self.bottom_mask)
+        self.board_mask = sum(self.column_mask)
+        self.center_columns = tuple(sorted({(cols - 1) // 2, cols // 2}))
+        self.center_order = tuple(sorted(range(cols), key=lambda c: abs(2 * c - (cols - 1))))
+        # Bit distance between neighbours: vertical, horizontal and both diagonals
+        self.shifts = (1, h1, h1 - 1, h1 + 1)
+        if connect == 4:
+            self.has_line = self.has_four
+            self.winning_cells = self.winning_cells_four
+
+        self.windows = self.build_windows()
+        self.window_masks = [sum(1 << index for index in window) for window in self.windows]
+        # Windows each cell (by bit index) belongs to
+        self.cell_windows = tuple(
+            tuple(w for w, window in enumerate(self.windows) if index in window) for index in range(cols * h1)
+        )
+
+        # A window's state packs its piece counts as red + base * yellow
+        base = connect + 1
+        self.window_state_step = (1, base)
+        # Value of each window state from red's point of view
+        self.window_values = tuple(
+            evaluate_window(state % base, state // base, connect, weights)
+            - evaluate_window(state // base, state % base, connect, weights)
+            if state % base + state // base <= connect else 0
+            for state in range(base * base)
+        )
+        # Change in red's score when a player adds a piece to a window in a given state
+        self.window_gain = tuple(
+            tuple(self.window_values[state + step] - self.window_values[state] if state + step < base * base else 0
+                  for state in range(base * base))
+            for step in self.window_state_step
+        )
+        # Change in red's score from the cell itself (the center bonus), per player
+        self.cell_gain = tuple(
+            tuple(sign * weights.center if index // h1 in self.center_columns else 0 for index in range(cols * h1))
+            for sign in (1, -1)
+        )
+
+    def __repr__(self) -> str:
+        return f"Geometry(rows={self.rows}, cols={self.cols}, connect={self.connect}, weights={self.weights})"
+
+    def cell_bit(self, row: int, col: int) -> int:
+        """Bit for a cell, with row 0 at the bottom of the board."""
+        return 1 << (col * self.h1 + row)
+
+    def build_windows(self) -> List[Tuple[int, ...]]:
+        """Bit indexes of every horizontal, vertical and diagonal window."""
+        windows = []
+        reach = self.connect - 1
+        for row in range(self.rows):
+            for col in range(self.cols):
+                for dr, dc in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+                    end_row, end_col = row + reach * dr, col + reach * dc
+                    if 0 <= end_row < self.rows and end_col < self.cols:
+                        windows.append(tuple((col + i * dc) * self.h1 + row + i * dr for i in range(self.connect)))
+        return windows
+
+    def has_line(self, bitboard: int) -> bool:
+        """Check a single player's bitboard for a winning line."""
+        for shift in self.shifts:
+            run = bitboard
+            for i in range(1, self.connect):
+                run &= bitboard >> (i * shift)
+            if run:
+                return True
+        return False
+
+    def has_four(self, bitboard: int) -> bool:
+        """has_line for four in a row."""
+        # Vertical, horizontal and both diagonals
+        for shift in self.shifts:
+            pairs = bitboard & (bitboard >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+
+    def winning_cells(self, bitboard: int, mask: int) -> int:
+        """Empty cells that would complete a line for a bitboard."""
+        cells = 0
+        connect = self.connect
+        for shift in self.shifts:
+            # The empty cell can sit at any place j along the line
+            for j in range(connect):
+                run = -1
+                for i in range(connect):
+                    if i != j:
+                        offset = (i - j) * shift
+                        run &= bitboard >> offset if offset > 0 else bitboard << -offset
+                cells |= run
+        return cells & (self.board_mask ^ mask)
+
+    def winning_cells_four(self, bitboard: int, mask: int) -> int:
+        """winning_cells for four in a row."""
+        h1 = self.h1
+        # Vertical: three stacked pieces below the cell
+        cells = (bitboard << 1) & (bitboard << 2) & (bitboard << 3)
+        for shift in (h1, h1 - 1, h1 + 1):
+            # Horizontal and both diagonals, with the gap anywhere in the line
+            pair = (bitboard << shift) & (bitboard << 2 * shift)
+            cells |= pair & (bitboard << 3 * shift)
+            cells |= pair & (bitboard >> shift)
+            pair = (bitboard >> shift) & (bitboard >> 2 * shift)
+            cells |= pair & (bitboard << shift)
+            cells |= pair & (bitboard >> 3 * shift)
+        return cells & (self.board_mask ^ mask)
+
+
+_geometries = {}
+
+
+def get_geometry(rows: int = ROWS, cols: int = COLS, connect: int = CONNECT,
+                 weights: Optional[EvalWeights] = None) -> Geometry:
+    """The shared Geometry for a board size, win length and evaluation weights."""
+    key = (rows, cols, connect, weights or WEIGHTS)
+    geometry = _geometries.get(key)
+    if geometry is None:
+        geometry = _geometries[key] = Geometry(*key)
+    return geometry
+
+
+DEFAULT_GEOMETRY = get_geometry()
+
+
+class Position:
+    """Board position stored as one bitboard per player."""
+
+    __slots__ = ("geometry", "boards", "mask", "moves", "heights", "history", "mirrored", "window_states", "score")
+
+    def __init__(self, geometry: Optional[Geometry] = None):
+        self.geometry = geometry = geometry or DEFAULT_GEOMETRY
+        self.boards = [0, 0]  # Indexed like PLAYERS
+        self.mask = 0
+        self.moves = 0
+        # Bit index of the next free cell in each column
+        self.heights = [col * geometry.h1 for col in range(geometry.cols)]
+        # Columns played since the position was built, for undo
+        self.history = []
+        # Bitboards of the mirror-image position, for canonical keys
+        self.mirrored = [0, 0]
+        # Evaluation kept up to date by play/undo: one window_values index
+        # per window, and the total score from red's point of view
+        self.window_states = [0] * len(geometry.windows)
+        self.score = 0
+
+    @classmethod
+    def from_board(cls, board: List[List[Optional[str]]], connect: int = CONNECT) -> "Position":
+        """Build a position from the GUI board (row 0 is the top row)."""
+        geometry = get_geometry(len(board), len(board[0]), connect)
+        position = cls(geometry)
+        for r, row in enumerate(board):
+            for c, piece in enumerate(row):
+                if piece is not None:
+                    bit = geometry.cell_bit(geometry.rows - 1 - r, c)
+                    position.boards[PLAYERS.index(piece)] |= bit
+                    position.mask |= bit
+                    position.moves += 1
+        position.rebuild()
+        return position
+
+    @classmethod
+    def from_bitboards(cls, boards: List[int], moves: int, geometry: Optional[Geometry] = None) -> "Position":
+        """Build a position from its two bitboards."""
+        position = cls(geometry)
+        position.boards = boards[:]
+        position.mask = boards[0] | boards[1]
+        position.moves = moves
+        position.rebuild()
+        return position
+
+    def copy(self) -> "Position":
+        """Return an independent copy of this position."""
+        position = Position(self.geometry)
+        position.boards = self.boards[:]
+        position.mask = self.mask
+        position.moves = self.moves
+        position.heights = self.heights[:]
+        position.history = self.history[:]
+        position.mirrored = self.mirrored[:]
+        position.window_states = self.window_states[:]
+        position.score = self.score
+        return position
+
+    def rebuild(self):
+        """Recompute column heights, mirror bitboards and the evaluation from the bitboards."""
+        g = self.geometry
+        self.heights = [col * g.h1 + (self.mask & g.column_mask[col]).bit_count() for col in range(g.cols)]
+        self.mirrored = [sum(bit for index, bit in enumerate(g.mirror_bits) if board >> index & 1)
+                         for board in self.boards]
+        red, yellow = self.boards
+        self.window_states = [
+            (red & window).bit_count() + g.window_state_step[1] * (yellow & window).bit_count()
+            for window in g.window_masks
+        ]
+        self.score = sum(g.window_values[state] for state in self.window_states)
+        for col in g.center_columns:
+            center = g.column_mask[col]
+            self.score += g.weights.center * ((red & center).bit_count() - (yellow & center).bit_count())
+
+    @property
+    def current(self) -> int:
+        """Index of the player to move (red always starts)."""
+        return self.moves & 1
+
+    def can_play(self, col: int) -> bool:
+        """Check whether a column still has room."""
+        return not self.mask & self.geometry.top_mask[col]
+
+    def legal_moves(self) -> List[int]:
+        """Playable columns, left to right."""
+        mask = self.mask
+        return [c for c, top in enumerate(self.geometry.top_mask) if not mask & top]
+
+    def play(self, col: int):
+        """Drop a piece for the player to move."""
+        index = self.heights[col]
+        self.heights[col] = index + 1
+        self.history.append(col)
+        bit = 1 << index
+        player = self.moves & 1
+        self.boards[player] |= bit
+        self.mask |= bit
+        self.moves += 1
+
+        g = self.geometry
+        self.mirrored[player] |= g.mirror_bits[index]
+        gain = g.window_gain[player]
+        step = g.window_state_step[player]
+        states = self.window_states
+        score = self.score + g.cell_gain[player][index]
+        for w in g.cell_windows[index]:
+            state = states[w]
+            score += gain[state]
+            states[w] = state + step
+        self.score = score
+
+    def undo(self):
+        """Take back the last move played."""
+        col = self.history.pop()
+        index = self.heights[col] - 1
+        self.heights[col] = index
+        bit = 1 << index
+        self.moves -= 1
+        player = self.moves & 1
+        self.boards[player] ^= bit
+        self.mask ^= bit
+
+        g = self.geometry
+        self.mirrored[player] ^= g.mirror_bits[index]
+        gain = g.window_gain[player]
+        step = g.window_state_step[player]
+        states = self.window_states
+        score = self.score - g.cell_gain[player][index]
+        for w in g.cell_windows[index]:
+            state = states[w] - step
+            score -= gain[state]
+            states[w] = state
+        self.score = score
+
+    def undo_to(self, length: int):
+        """Take back moves until only `length` remain in the history."""
+        while len(self.history) > length:
+            self.undo()
+
+    def has_won(self, player: int) -> bool:
+        """Check whether a player has a winning line."""
+        return self.geometry.has_line(self.boards[player])
+
+    def last_move_won(self) -> bool:
+        """Check whether the player who just moved has a winning line.
+
+        Only the piece just played can complete a line, so the player to
+        move never needs checking.
+        """
+        return self.geometry.has_line(self.boards[(self.moves & 1) ^ 1])
+
+    def possible(self) -> int:
+        """Mask of the cells where a piece can be dropped."""
+        return (self.mask + self.geometry.bottom_row) & self.geometry.board_mask
+
+    def is_winning_move(self, col: int) -> bool:
+        """Check whether playing a column wins for the player to move."""
+        return bool(self.geometry.winning_cells(self.boards[self.moves & 1], self.mask) >> self.heights[col] & 1)
+
+    def can_win_next(self) -> bool:
+        """Check whether the player to move has a winning drop."""
+        return bool(self.geometry.winning_cells(self.boards[self.moves & 1], self.mask) & self.possible())
+
+    def non_losing_moves(self) -> int:
+        """Drops that do not hand the opponent an immediate win.
+
+        Returns 0 when every move loses. Assumes the player to move cannot
+        win immediately.
+        """
+        possible = self.possible()
+        threats = self.geometry.winning_cells(self.boards[1 - (self.moves & 1)], self.mask)
+        forced = possible & threats
+        if forced:
+            if forced & (forced - 1):
+                return 0  # Two threats at once cannot both be blocked
+            possible = forced
+        # Never play directly below an opponent's winning cell
+        return possible & ~(threats >> 1)
+
+    def is_full(self) -> bool:
+        """Check whether every cell is taken."""
+        return self.moves == self.geometry.cells
+
+    def key(self) -> int:
+        """Integer key for this position, unique for every board size.
+
+        Keys of boards with more than 63 key bits (see
+        Geometry.exact_keys) do not fit a 64-bit slot; the transposition
+        table keeps them as Python ints instead.
+        """
+        return self.boards[self.moves & 1] + self.mask
+
+    def canonical_key(self) -> Tuple[int, bool]:
+        """Key shared by this position and its left-right mirror image.
+
+        Returns (the smaller of the two keys, whether it is the mirror's).
+        Both positions have the same score and mirrored best moves, so
+        tables keyed this way hold each pair once; when the flag is set,
+        moves are passed through mirror_move on the way in and out.
+        """
+        current = self.moves & 1
+        key = self.boards[current] + self.mask
+        mirrored = self.mirrored
+        mirror_key = mirrored[current] + (mirrored[0] | mirrored[1])
+        if mirror_key < key:
+            return mirror_key, True
+        return key, False
+
+
+def mirror_move(move: Optional[int], geometry: Geometry, mirrored: bool = True) -> Optional[int]:
+    """A column reflected left to right if mirrored is set (None stays None)."""
+    if move is None or not mirrored:
+        return move
+    return geometry.cols - 1 - move
+
+
+def score_position(position: Position, player: int) -> int:
+    """Score a position for a player relative to the opponent.
+
+    Reads the evaluation that play/undo keep up to date, so it is O(1).
+    """
+    return position.score if player == 0 else -position.score
+
+
+class TranspositionTable:
+    """Fixed-size transposition table keyed by Position.canonical_key().
+
+    Entries live in flat arrays, so the memory budget is set once at
+    construction. Each bucket has a depth-preferred slot, which keeps the
+    deepest result seen in the current search, and an always-replace slot.
+    Keys are compared whole: boards whose keys need more than 63 bits keep
+    them in a list rather than a 64-bit array (see clear).
+    """
+
+    # Bytes per entry: key, score, packed depth/bound/move and age
+    ENTRY_BYTES = 8 + 8 + 2 + 1
+
+    def __init__(self, size_mb: float = 16):
+        self.size_mb = size_mb
+        self.buckets = max(1, int(size_mb * 1024 * 1024) // (2 * self.ENTRY_BYTES))
+        self.clear()
+
+    def clear(self, exact_keys: bool = True):
+        """Drop every entry and reset the counters.
+
+        Pass the geometry's exact_keys: without it, keys are held in a
+        list of ints, which costs more memory than size_mb accounts for.
+        """
+        slots = 2 * self.buckets
+        self.keys = array("q", [-1]) * slots if exact_keys else [-1] * slots
+        self.scores = array("q", [0]) * slots
+        # depth in bits 0-7, bound type in bits 8-9, best move + 1 in bits 10-15
+        self.info = array("H", [0]) * slots
+        self.ages = array("B", [0]) * slots
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def new_search(self):
+        """Age existing entries so a new search may replace them."""
+        self.age = (self.age + 1) & 0xFF
+
+    def probe(self, key: int) -> Optional[Tuple[int, int, int, Optional[int]]]:
+        """Return (depth, bound, score, best move) for a key, or None."""
+        slot = 2 * (key % self.buckets)
+        if self.keys[slot] != key:
+            slot += 1
+            if self.keys[slot] != key:
+                self.misses += 1
+                return None
+        self.hits += 1
+        info = self.info[slot]
+        move = (info >> 10) - 1
+        return (info & 0xFF, (info >> 8) & 0x3, self.scores[slot], move if move >= 0 else None)
+
+    def store(self, key: int, depth: int, bound: int, score: int, move: Optional[int]):
+        """Store a search result, preferring deeper results in the first slot."""
+        slot = 2 * (key % self.buckets)
+        keys = self.keys
+        if keys[slot] != key and self.ages[slot] == self.age and depth < (self.info[slot] & 0xFF):
+            slot += 1
+        elif keys[slot] != -1 and keys[slot] != key:
+            # Demote the old depth-preferred entry instead of losing it
+            keys[slot + 1] = keys[slot]
+            self.scores[slot + 1] = self.scores[slot]
+            self.info[slot + 1] = self.info[slot]
+            self.ages[slot + 1] = self.ages[slot]
+        keys[slot] = key
+        self.scores[slot] = score
+        self.info[slot] = depth | (bound << 8) | ((move + 1 if move is not None else 0) << 10)
+        self.ages[slot] = self.age
+        self.stores += 1
+
+    def stats(self) -> dict:
+        """Occupancy and hit/miss counters for sizing the table."""
+        probes = self.hits + self.misses
+        used = sum(1 for key in self.keys if key != -1)
+        return {
+            "size_mb": self.size_mb,
+            "entries": len(self.keys),
+            "used": used,
+            "fill_rate": used / len(self.keys),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "miss_rate": self.misses / probes if probes else 0.0,
+            "stores": self.stores,
+        }
+
+
+def score_to_table(score: float, ply: int) -> int:
+    """Make win/loss scores relative to the node before storing them."""
+    if score > WIN_THRESHOLD:
+        return int(score) + ply
+    if score < -WIN_THRESHOLD:
+        return int(score) - ply
+    return int(score)
+
+
+def score_from_table(score: int, ply: int) -> int:
+    """Turn a stored win/loss score back into one relative to the root."""
+    if score > WIN_THRESHOLD:
+        return score - ply
+    if score < -WIN_THRESHOLD:
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget runs out."""
+
+
+class SearchResult(NamedTuple):
+    """Outcome of the last completed search iteration."""
+    move: Optional[int]
+    score: float
+    depth: int
+    nodes: int
+    elapsed_ms: float
+
+
+class EndgameSolver:
+    """Exact solver for positions close to the end of the game.
+
+    Scores follow the usual solved-game convention: positive means the
+    player to move wins, and the magnitude grows the sooner the game ends
+    (a win with your last stone scores 1, 0 is a draw). Each solve is a
+    sequence of null-window negamax searches that narrow the score.
+    """
+
+    def __init__(self, tt_size_mb: float = 8):
+        self.nodes = 0
+        self.deadline = None
+        self.cancelled = False
+        self.table = TranspositionTable(tt_size_mb)
+
+    def best_move(self, position: Position) -> Tuple[int, int]:
+        """Return (column, exact score) for the player to move."""
+        g = position.geometry
+        for col in g.center_order:
+            if position.can_play(col) and position.is_winning_move(col):
+                return col, (g.cells + 1 - position.moves) // 2
+
+        best_col, best_score = None, -math.inf
+        for col in g.center_order:
+            if not position.can_play(col):
+                continue
+            position.play(col)
+            try:
+                score = -self.solve(position)
+            finally:
+                position.undo()
+            if score > best_score:
+                best_col, best_score = col, score
+        return best_col, best_score
+
+    def solve(self, position: Position) -> int:
+        """Exact score of a position, found by null-window searches."""
+        cells = position.geometry.cells
+        if position.can_win_next():
+            return (cells + 1 - position.moves) // 2
+        low = -((cells - position.moves) // 2)
+        high = (cells + 1 - position.moves) // 2
+        while low < high:
+            # Probe near zero first: most endgames are close to a draw
+            med = low + (high - low) // 2
+            if med <= 0 and low // 2 < med:
+                med = low // 2
+            elif med >= 0 and high // 2 > med:
+                med = high // 2
+            result = self.negamax(position, med, med + 1)
+            if result <= med:
+                high = result
+            else:
+                low = result
+        return low
+
+    def negamax(self, position: Position, alpha: int, beta: int) -> int:
+        """Fail-hard negamax; assumes the player to move cannot win at once."""
+        self.nodes += 1
+        if not self.nodes & SearchEngine.TIME_CHECK_MASK and (
+                self.cancelled or self.deadline is not None and time.perf_counter() > self.deadline):
+            raise SearchTimeout()
+
+        g = position.geometry
+        cells = g.cells
+        moves = position.moves
+        candidates = position.non_losing_moves()
+        if not candidates:
+            return -((cells - moves) // 2)
+        if moves >= cells - 2:
+            return 0
+
+        low = -((cells - 2 - moves) // 2)
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+        high = (cells - 1 - moves) // 2
+        key, mirrored = position.canonical_key()
+        entry = self.table.probe(key)
+        if entry is not None:
+            bound, score = entry[1], entry[2]
+            if bound == LOWER_BOUND:
+                if alpha < score:
+                    alpha = score
+                    if alpha >= beta:
+                        return alpha
+            elif score < high:
+                high = score
+        if beta > high:
+            beta = high
+            if alpha >= beta:
+                return beta
+
+        # Try moves that create the most new threats first
+        player = position.current
+        ordered = []
+        for col in g.center_order:
+            bit = candidates & g.column_mask[col]
+            if bit:
+                threats = g.winning_cells(position.boards[player] | bit, position.mask | bit)
+                ordered.append((-threats.bit_count(), len(ordered), col))
+        ordered.sort()
+
+        for _, _, col in ordered:
+            position.play(col)
+            score = -self.negamax(position, -beta, -alpha)
+            position.undo()
+            if score >= beta:
+                self.table.store(key, 0, LOWER_BOUND, score, g.cols - 1 - col if mirrored else col)
+                return score
+            if score > alpha:
+                alpha = score
+        self.table.store(key, 0, UPPER_BOUND, alpha, None)
+        return alpha
+
+
+class SearchStats:
+    """Counters collected by an instrumented search.
+
+    Only the serial search fills these in; with a worker pool they cover
+    the work done in the calling process.
+    """
+
+    def __init__(self):
+        self.nodes_by_ply = []
+        self.interior_nodes = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.evaluations = 0
+        self.eval_time = 0.0
+        self.movegen_time = 0.0
+        self.elapsed_ms = 0.0
+
+    def count_node(self, ply: int):
+        """Count a visited node at its distance from the root."""
+        if ply == len(self.nodes_by_ply):
+            self.nodes_by_ply.append(0)
+        self.nodes_by_ply[ply] += 1
+
+    def as_dict(self) -> dict:
+        """Counters plus the derived rates, ready for JSON."""
+        return {
+            "nodes": sum(self.nodes_by_ply),
+            "nodes_by_ply": self.nodes_by_ply,
+            "interior_nodes": self.interior_nodes,
+            "beta_cutoffs": self.beta_cutoffs,
+            "beta_cutoff_rate": self.beta_cutoffs / self.interior_nodes if self.interior_nodes else 0.0,
+            "first_move_cutoff_rate": self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.0,
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "tt_hit_rate": self.tt_hits / self.tt_probes if self.tt_probes else 0.0,
+            "tt_cutoffs": self.tt_cutoffs,
+            "evaluations": self.evaluations,
+            "eval_ms": self.eval_time * 1000,
+            "movegen_ms": self.movegen_time * 1000,
+            "elapsed_ms": self.elapsed_ms,
+        }
+
+
+def solver_to_engine_score(score: int, moves: int, cells: int = ROWS * COLS) -> int:
+    """Convert an exact solver score into the search's win/loss scale."""
+    if score == 0:
+        return 0
+    # Plies until the winning stone; odd when the player to move wins
+    plies = cells + 2 - moves - 2 * abs(score)
+    if (plies & 1) != (score > 0):
+        plies -= 1
+    return WIN_SCORE - plies if score > 0 else -(WIN_SCORE - plies)
+
+
+class Searcher:
+    """Interface shared by the search backends.
+
+    search() looks for the best move of the player to move and returns a
+    SearchResult, or None if it was cancelled before it had one. cancel()
+    may be called from another thread. SearchWorker, the GUI and the
+    tournament use nothing else, so any backend can stand in for another.
+    """
+
+    def __init__(self, book=None):
+        # Set from another thread by cancel(); checked while searching
+        self.cancelled = False
+        # Completed iterations of the last search, for reports
+        self.iterations = []
+        # Optional opening book: anything with lookup(position) -> (move, score) or None
+        self.book = book
+        # Instrumentation: counters of the last search, and an optional JSON-lines trace
+        self.instrument = False
+        self.stats = None
+        self.trace_path = None
+
+    def search(self, position: Position, max_depth: int, time_ms: Optional[float] = None) -> Optional[SearchResult]:
+        """Search a position for up to max_depth plies or time_ms milliseconds."""
+        raise NotImplementedError
+
+    def best_move(self, position: Position, depth: int, time_ms: Optional[float] = None) -> Optional[int]:
+        """Search the position and return the best column, or None if there is none."""
+        result = self.search(position, depth, time_ms)
+        return result.move if result is not None else None
+
+    def book_move(self, position: Position, start: float) -> Optional[SearchResult]:
+        """The opening book's answer for a position, if it has a playable one."""
+        if self.book is None:
+            return None
+        entry = self.book.lookup(position)
+        if entry is None or not position.can_play(entry[0]):
+            return None
+        return SearchResult(entry[0], entry[1], 0, 0, (time.perf_counter() - start) * 1000)
+
+    def new_game(self):
+        """Forget whatever was learned about the previous game."""
+
+    def predicted_replies(self, position: Position) -> List[int]:
+        """Legal moves, the most likely reply first."""
+        return [c for c in position.geometry.center_order if position.can_play(c)]
+
+    def cancel(self):
+        """Stop the running search soon; searches keep stopping until resume()."""
+        self.cancelled = True
+
+    def resume(self):
+        """Allow searches to run again after cancel()."""
+        self.cancelled = False
+
+    def close(self):
+        """Release worker processes or other resources, if any."""
+
+
+class SearchEngine(Searcher):
+    """Negamax alpha-beta search over bitboard positions."""
+
+    # Nodes between clock checks (must be a power of two minus one)
+    TIME_CHECK_MASK = 255
+    # Shallowest remaining depth at which moves are sorted by history
+    HISTORY_MIN_DEPTH = 3
+    # Share of the time budget the endgame solver may use before iterative deepening takes over
+    ENDGAME_TIME_SHARE = 0.5
+
+    def __init__(self, tt_size_mb: float = 16, endgame_empties: int = 16, workers: int = 1, book=None,
+                 instrument: bool = False, trace_path: Optional[str] = None, seed: int = 0):
+        super().__init__(book)
+        self.nodes = 0
+        self.deadline = None
+        self.root_move = None
+        self.tt_size_mb = tt_size_mb
+        self.table = TranspositionTable(tt_size_mb)
+        # Solve exactly once this few cells are left
+        self.endgame_empties = endgame_empties
+        self.solver = EndgameSolver()
+        # Games and searches started, so pool workers know when to age their own tables
+        self.games = 0
+        self.searches = 0
+        # In a pool worker: the shared window, whose generation changes when the job is stale
+        self.stop_window = None
+        self.stop_generation = 0
+        # Move ordering tables, sized for the geometry being searched
+        self.seed = seed
+        self.geometry = None
+        self.use_geometry(DEFAULT_GEOMETRY)
+        # Root moves are spread over a process pool when workers > 1 (0 means all cores)
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+        self.shared_window = None
+        self.generation = 0
+        self.instrument = instrument
+        self.trace_path = trace_path
+
+    def use_geometry(self, geometry: Geometry):
+        """Set up the move-ordering tables for the board about to be searched.
+
+        Switching to another geometry also clears both transposition
+        tables, since keys are only unique within one geometry.
+        """
+        if geometry is self.geometry:
+            return
+        if self.geometry is not None or not geometry.exact_keys:
+            self.table.clear(geometry.exact_keys)
+            self.solver.table.clear(geometry.exact_keys)
+        self.geometry = geometry
+        # Base move order: center first, with columns equally far from the
+        # center in an order fixed by the seed, so equal moves are broken
+        # the same way on every run
+        rng = random.Random(self.seed)
+        cols = geometry.cols
+        self.move_order = tuple(sorted(range(cols), key=lambda c: (abs(2 * c - (cols - 1)), rng.random())))
+        self.new_game()
+
+    def new_game(self):
+        """Forget the move-ordering history of the previous game."""
+        # Two killer cells per ply, and history scores per player and cell
+        # that carry over between the searches of one game
+        self.killers = [[-1, -1] for _ in range(self.geometry.cells + 1)]
+        self.history = [[0] * (self.geometry.cols * self.geometry.h1) for _ in PLAYERS]
+        self.games += 1
+
+    def age_history(self):
+        """Halve the history scores, so they follow the game as it develops."""
+        self.history = [[score >> 1 for score in scores] for scores in self.history]
+
+    def cancel(self):
+        """Stop the running search at its next clock check.
+
+        Safe to call from another thread. Searches keep stopping until
+        resume() is called.
+        """
+        super().cancel()
+        self.solver.cancelled = True
+        # Pool workers stop at their next clock check; no job has generation 0
+        window = self.shared_window
+        if window is not None:
+            with window.get_lock():
+                window[0] = 0
+
+    def resume(self):
+        """Allow searches to run again after cancel()."""
+        super().resume()
+        self.solver.cancelled = False
+
+    def predicted_replies(self, position: Position) -> List[int]:
+        """Legal moves, with the table's best move (the expected one) first."""
+        self.use_geometry(position.geometry)
+        moves = [c for c in self.move_order if position.can_play(c)]
+        key, mirrored = position.canonical_key()
+        entry = self.table.probe(key)
+        expected = mirror_move(entry[3], position.geometry, mirrored) if entry is not None else None
+        if expected in moves:
+            moves.remove(expected)
+            moves.insert(0, expected)
+        return moves
+
+    def search(self, position: Position, max_depth: int, time_ms: Optional[float] = None) -> Optional[SearchResult]:
+        """Search a position; see run_search.
+
+        With instrument set, self.stats holds the counters of this search
+        afterwards, and each search is appended to trace_path if set.
+        """
+        self.stats = SearchStats() if self.instrument else None
+        result = self.run_search(position, max_depth, time_ms)
+        if self.stats is not None and result is not None:
+            self.stats.elapsed_ms = result.elapsed_ms
+            if self.trace_path is not None:
+                self.write_trace(position, result)
+        return result
+
+    def write_trace(self, position: Position, result: SearchResult):
+        """Append one JSON line describing the last search to trace_path."""
+        record = {
+            "time": time.time(),
+            "key": position.key(),
+            "moves": position.moves,
+            "result": result._asdict(),
+            "iterations": [it._asdict() for it in self.iterations],
+            "stats": self.stats.as_dict(),
+        }
+        with open(self.trace_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def run_search(self, position: Position, max_depth: int, time_ms: Optional[float] = None) -> Optional[SearchResult]:
+        """Iterative deepening up to max_depth or until time_ms runs out.
+
+        The first iteration always completes, and the result of the last
+        completed iteration is returned. Each iteration leaves its best
+        moves in the transposition table, where the next one picks them up
+        for move ordering.
+
+        Book positions are answered from the opening book. Once at most
+        endgame_empties cells are left and the depth cap reaches the end of
+        the game, the exact solver is tried first with ENDGAME_TIME_SHARE
+        of time_ms; if it runs out, iterative deepening gets the rest.
+        Every completed iteration is kept in self.iterations.
+
+        A cancelled search also returns its last completed iteration, or
+        None if it was cancelled during the first.
+        """
+        start = time.perf_counter()
+        self.nodes = 0
+        self.deadline = None
+        self.iterations = []
+        self.use_geometry(position.geometry)
+        result = self.book_move(position, start)
+        if result is not None:
+            return result
+        self.table.new_search()
+        self.searches += 1
+        empties = position.geometry.cells - position.moves
+        if empties <= self.endgame_empties and max_depth >= empties:
+            solver_ms = time_ms * self.ENDGAME_TIME_SHARE if time_ms is not None else None
+            result = self.solve_endgame(position, start, solver_ms)
+            if result is not None:
+                self.iterations.append(result)
+                return result
+
+        max_depth = max(1, min(max_depth, empties))
+        result = None
+        self.age_history()
+        self.root_move = None
+
+        # The search plays moves on the caller's position and takes them
+        # back; a timeout can leave some played, so rewind to this length
+        played = len(position.history)
+        for depth in range(1, max_depth + 1):
+            if self.cancelled:
+                break  # Parallel iterations only notice cancellation here
+            try:
+                if self.workers > 1:
+                    move, score = self.search_root_parallel(position, depth, self.root_move)
+                else:
+                    move, score = self.negamax(position, depth, -math.inf, math.inf)
+            except SearchTimeout:
+                position.undo_to(played)
+                break
+            self.root_move = move
+            result = SearchResult(move, score, depth, self.nodes, (time.perf_counter() - start) * 1000)
+            self.iterations.append(result)
+            if abs(score) > WIN_THRESHOLD:
+                break  # Forced result, deeper search cannot change it
+            if time_ms is not None:
+                self.deadline = start + time_ms / 1000
+
+        self.deadline = None
+        return result
+
+    def get_pool(self):
+        """Start the worker pool on first use; it is reused for every move."""
+        if self.pool is None:
+            # Imported here so plain engine imports stay fast
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Spawn rather than fork: the GUI calls in from a worker thread
+            context = multiprocessing.get_context("spawn")
+            # [search generation, best exact root score so far]
+            self.shared_window = context.Array("q", [0, PARALLEL_NO_SCORE])
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=context,
+                initializer=_init_search_worker, initargs=(self.shared_window, self.tt_size_mb),
+            )
+        return self.pool
+
+    def close(self):
+        """Shut down the worker pool, if one was started."""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def search_root_parallel(self, position: Position, depth: int, previous_best: Optional[int]) -> Tuple[Optional[int], float]:
+        """Search each root move in a worker process and combine the results.
+
+        The first move (the previous iteration's best) is searched alone
+        to an exact score, which sets the shared window. The other moves
+        are then searched in parallel just below the best exact root
+        score found so far, so only moves that could tie or beat it get
+        exact scores. The best exact score wins; ties go to the earlier move in
+        the fixed root order, which makes the result independent of which
+        worker finishes first.
+        """
+        moves = [c for c in self.move_order if position.can_play(c)]
+        for col in moves:
+            if position.is_winning_move(col):
+                return col, WIN_SCORE - 1
+        if previous_best in moves:
+            moves.remove(previous_best)
+            moves.insert(0, previous_best)
+
+        pool = self.get_pool()
+        self.generation += 1
+        with self.shared_window.get_lock():
+            self.shared_window[0] = self.generation
+            self.shared_window[1] = PARALLEL_NO_SCORE
+        if self.cancelled:
+            raise SearchTimeout()  # cancel() ran before the new generation was set
+        # Wall-clock deadline, since perf_counter is not comparable across processes
+        deadline = None if self.deadline is None else time.time() + (self.deadline - time.perf_counter())
+        g = position.geometry
+        shape = (g.rows, g.cols, g.connect, g.weights)
+
+        def submit(col):
+            return pool.submit(_search_root_move, position.boards[:], position.mask, position.moves,
+                               col, depth, deadline, self.generation, shape, (self.games, self.searches))
+
+        results = [submit(moves[0]).result()]
+        self.nodes += results[0][2]
+        if results[0][1] is None:
+            raise SearchTimeout()
+        futures = [submit(col) for col in moves[1:]]
+        results += [future.result() for future in futures]
+        self.nodes += sum(nodes for _, _, nodes in results[1:])
+        if any(score is None for _, score, _ in results):
+            raise SearchTimeout()
+
+        best_col, best_score = None, -math.inf
+        for col, score, _ in results:
+            if score is not None and score > best_score:
+                best_col, best_score = col, score
+        return best_col, best_score
+
+    def solve_endgame(self, position: Position, start: float, time_ms: Optional[float]) -> Optional[SearchResult]:
+        """Solve the position exactly, or return None if time runs out."""
+        solver = self.solver
+        solver.nodes = 0
+        solver.deadline = start + time_ms / 1000 if time_ms is not None else None
+        played = len(position.history)
+        try:
+            move, score = solver.best_move(position)
+        except SearchTimeout:
+            return None
+        finally:
+            position.undo_to(played)
+            self.nodes += solver.nodes
+            solver.deadline = None
+        cells = position.geometry.cells
+        empties = cells - position.moves
+        return SearchResult(move, solver_to_engine_score(score, position.moves, cells), empties,
+                            self.nodes, (time.perf_counter() - start) * 1000)
+
+    def negamax(self, position: Position, depth: int, alpha: float, beta: float, ply: int = 0) -> Tuple[Optional[int], float]:
+        """Negamax with alpha-beta pruning and a transposition table.
+
+        Scores are from the point of view of the player to move; wins found
+        closer to the root score higher. An immediate win is returned
+        without searching; other moves are tried in order_moves order.
+        """
+        self.nodes += 1
+        if not self.nodes & self.TIME_CHECK_MASK and (
+                self.cancelled or self.deadline is not None and time.perf_counter() > self.deadline
+                or self.stop_window is not None and self.stop_window[0] != self.stop_generation):
+            raise SearchTimeout()
+        stats = self.stats
+        if stats is not None:
+            stats.count_node(ply)
+        player = position.current
+
+        if position.last_move_won():
+            return (None, -(WIN_SCORE - ply))
+        if position.is_full():
+            return (None, 0)
+        if depth == 0:
+            if stats is not None:
+                started = time.perf_counter()
+                score = score_position(position, player)
+                stats.eval_time += time.perf_counter() - started
+                stats.evaluations += 1
+                return (None, score)
+            return (None, score_position(position, player))
+
+        g = position.geometry
+        possible = position.possible()
+        wins = g.winning_cells(position.boards[player], position.mask) & possible
+        if wins:
+            return ((wins & -wins).bit_length() - 1) // g.h1, WIN_SCORE - ply - 1
+
+        alpha_orig = alpha
+        # Mirror images share an entry; its move is stored for the canonical one
+        key, mirrored = position.canonical_key()
+        entry = self.table.probe(key)
+        tt_move = None
+        if stats is not None:
+            stats.tt_probes += 1
+            stats.tt_hits += entry is not None
+        if entry is not None:
+            tt_depth, bound, tt_score, tt_move = entry
+            if mirrored and tt_move is not None:
+                tt_move = g.cols - 1 - tt_move
+            if tt_depth >= depth:
+                tt_score = score_from_table(tt_score, ply)
+                if bound == EXACT:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
+                    return (tt_move, tt_score)
+                elif bound == LOWER_BOUND:
+                    alpha = max(alpha, tt_score)
+                else:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
+                    return (tt_move, tt_score)
+
+        if tt_move is None and ply == 0:
+            tt_move = self.root_move
+
+        if stats is not None:
+            started = time.perf_counter()
+        blocks = g.winning_cells(position.boards[1 - player], position.mask) & possible
+        if blocks and depth >= 2:
+            # Every other move lets the opponent win next turn, which the
+            # child would find anyway; two threats cannot both be blocked
+            col = ((blocks & -blocks).bit_length() - 1) // g.h1
+            if blocks & (blocks - 1):
+                return col, -(WIN_SCORE - ply - 2)
+            valid_locations = [col]
+        else:
+            valid_locations = self.order_moves(position, ply, depth, tt_move, blocks)
+        if stats is not None:
+            stats.movegen_time += time.perf_counter() - started
+            stats.interior_nodes += 1
+        value = -math.inf
+        best_column = valid_locations[0]
+        for col in valid_locations:
+            position.play(col)
+            new_score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)[1]
+            position.undo()
+            if new_score > value:
+                value = new_score
+                best_column = col
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                if stats is not None:
+                    stats.beta_cutoffs += 1
+                    stats.first_move_cutoffs += col == valid_locations[0]
+                cell = position.heights[col]
+                killers = self.killers[ply]
+                if cell != killers[0]:
+                    killers[1] = killers[0]
+                    killers[0] = cell
+                self.history[player][cell] += depth * depth
+                break
+
+        if value <= alpha_orig:
+            bound = UPPER_BOUND
+        elif value >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.table.store(key, depth, bound, score_to_table(value, ply),
+                         g.cols - 1 - best_column if mirrored else best_column)
+        return best_column, value
+
+    def order_moves(self, position: Position, ply: int, depth: int, tt_move: Optional[int], blocks: int) -> List[int]:
+        """Legal moves in search order.
+
+        The table (or previous iteration's) move comes first, then drops
+        that block an immediate threat, then this ply's killer moves, then
+        the rest by history score, ties broken by self.move_order. Killers
+        and history are kept per cell, so they only apply while the column
+        is at the same height. Near the leaves the history sort costs more
+        than it saves and is skipped.
+        """
+        g = position.geometry
+        mask = position.mask
+        heights = position.heights
+        top_mask = g.top_mask
+        moves = [c for c in self.move_order if not mask & top_mask[c]]
+        if depth >= self.HISTORY_MIN_DEPTH:
+            scores = self.history[position.moves & 1]
+            moves.sort(key=lambda c: -scores[heights[c]])
+        first = []
+        if tt_move is not None and not mask & top_mask[tt_move]:
+            first.append(tt_move)
+        if blocks:
+            first += [c for c in moves if blocks & g.column_mask[c] and c != tt_move]
+        for cell in self.killers[ply]:
+            col = cell // g.h1
+            if cell >= 0 and heights[col] == cell and col not in first:
+                first.append(col)
+        if first:
+            moves = first + [c for c in moves if c not in first]
+        return moves
+
+
+# Placeholder for "no exact root score yet" in the shared search window
+PARALLEL_NO_SCORE = -2 * WIN_SCORE
+
+# Per-process state of parallel search workers
+_worker_engine = None
+_worker_window = None
+# (game, search) of the parent engine when this worker last ran a job
+_worker_search = (0, 0)
+
+
+def _init_search_worker(shared_window, tt_size_mb: float):
+    """Give each worker process its own engine and the shared window."""
+    global _worker_engine, _worker_window
+    _worker_engine = SearchEngine(tt_size_mb)
+    _worker_engine.stop_window = shared_window
+    _worker_window = shared_window
+
+
+def _search_root_move(boards: List[int], mask: int, moves: int, col: int, depth: int,
+                      deadline: Optional[float], generation: int,
+                      shape: tuple = (ROWS, COLS, CONNECT),
+                      search: Tuple[int, int] = (0, 0)) -> Tuple[int, Optional[float], int]:
+    """Search one root move in a worker process.
+
+    shape holds get_geometry's arguments: (rows, cols, connect) and
+    optionally the evaluation weights. search is the parent engine's
+    (games, searches) count: the worker starts a new game or ages its
+    table and history when it changes, as the parent does. The search
+    stops early once the shared window moves to another generation.
+
+    Returns (column, score, nodes). The score is None when the deadline
+    passed. A move that cannot reach the shared best score gets a score
+    below it, which the caller ignores.
+    """
+    global _worker_search
+    engine, window = _worker_engine, _worker_window
+    with window.get_lock():
+        if window[0] != generation:
+            return col, None, 0  # Stale job from an abandoned iteration
+        best = window[1]
+    position = Position.from_bitboards(boards, moves, get_geometry(*shape))
+    position.play(col)
+    engine.use_geometry(position.geometry)
+    if search != _worker_search:
+        if search[0] != _worker_search[0]:
+            engine.new_game()
+        engine.table.new_search()
+        engine.age_history()
+        _worker_search = search
+
+    engine.stop_generation = generation
+    engine.nodes = 0
+    engine.deadline = None if deadline is None else time.perf_counter() + (deadline - time.time())
+    # Search just below the best so far, so ties come back exact
+    low = best - 1 if best != PARALLEL_NO_SCORE else -math.inf
+    try:
+        score = -engine.negamax(position, depth - 1, -math.inf, -low, 1)[1]
+    except SearchTimeout:
+        return col, None, engine.nodes
+    finally:
+        engine.deadline = None
+
+    if score > low:
+        with window.get_lock():
+            if window[0] == generation and score > window[1]:
+                window[1] = int(score)
+        return col, score, engine.nodes
+    return col, low, engine.nodes
+
+
+class SearchWorker:
+    """A long-lived thread that runs searches for an interactive client.
+
+    Every job gets a new generation number. Submitting a job or calling
+    cancel() makes all earlier generations stale: a stale search is
+    stopped at its next clock check, a stale job still queued is skipped,
+    and a stale result is never passed to on_result. Clients that hand
+    results to another thread should compare the generation with
+    is_current() once more before using it.
+
+    ponder() uses the opponent's thinking time: it searches the position
+    after each reply, the expected one first, and keeps the results so the
+    reply actually played can be answered without a new search.
+    """
+
+    def __init__(self, engine: Searcher, on_result):
+        # Imported here so plain engine imports stay fast
+        import queue
+        import threading
+
+        self.engine = engine
+        # Called on the worker thread as on_result(generation, result, stats)
+        self.on_result = on_result
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.jobs = queue.Queue()
+        # Pondered results by (geometry, canonical key): (max_depth, time_ms, result),
+        # with the result's move for the canonical position
+        self.pondered = {}
+        self.thread = threading.Thread(target=self.run, name="search-worker", daemon=True)
+        self.thread.start()
+
+    def submit(self, position: Position, max_depth: int, time_ms: Optional[float] = None) -> int:
+        """Queue a search of a copy of the position and return its generation."""
+        return self.queue_job(False, position, max_depth, time_ms)
+
+    def ponder(self, position: Position, max_depth: int, time_ms: Optional[float] = None) -> int:
+        """Queue searches of every reply to the position, with the same limits."""
+        self.pondered = {}
+        return self.queue_job(True, position, max_depth, time_ms)
+
+    def pondered_result(self, position: Position, max_depth: int, time_ms: Optional[float] = None) -> Optional[SearchResult]:
+        """The pondered result for a position if it was searched with these limits."""
+        key, mirrored = position.canonical_key()
+        entry = self.pondered.get((position.geometry, key))
+        if entry is None or entry[:2] != (max_depth, time_ms):
+            return None
+        result = entry[2]
+        return result._replace(move=mirror_move(result.move, position.geometry, mirrored))
+
+    def queue_job(self, ponder: bool, position: Position, max_depth: int, time_ms: Optional[float]) -> int:
+        """Make older jobs stale and queue a new one."""
+        with self.lock:
+            self.generation += 1
+            self.engine.cancel()
+            generation = self.generation
+        self.jobs.put((generation, ponder, position.copy(), max_depth, time_ms))
+        return generation
+
+    def cancel(self):
+        """Make every submitted job stale and stop the running search."""
+        with self.lock:
+            self.generation += 1
+            self.engine.cancel()
+
+    def set_engine(self, engine: Searcher):
+        """Run later jobs on another backend, dropping current jobs and pondered results."""
+        with self.lock:
+            self.generation += 1
+            self.engine.cancel()
+            self.engine = engine
+            self.pondered = {}
+
+    def is_current(self, generation: int) -> bool:
+        """Check whether a generation is still the latest one."""
+        return generation == self.generation
+
+    def close(self, timeout: float = 1.0):
+        """Stop the worker thread."""
+        self.cancel()
+        self.jobs.put(None)
+        self.thread.join(timeout)
+
+    def run(self):
+        """Worker loop: run jobs until close()."""
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            generation, ponder, position, max_depth, time_ms = job
+            with self.lock:
+                if generation != self.generation:
+                    continue
+                engine = self.engine
+                engine.resume()
+            if ponder:
+                self.run_ponder(engine, generation, position, max_depth, time_ms)
+                continue
+            try:
+                result = engine.search(position, max_depth, time_ms)
+                stats = engine.stats
+            except Exception:
+                result, stats = None, None
+            with self.lock:
+                if generation != self.generation:
+                    continue
+            self.on_result(generation, result, stats)
+
+    def run_ponder(self, engine: Searcher, generation: int, position: Position, max_depth: int,
+                   time_ms: Optional[float]):
+        """Search the replies to a position until done or made stale."""
+        for col in engine.predicted_replies(position):
+            position.play(col)
+            if not position.last_move_won() and not position.is_full():
+                try:
+                    result = engine.search(position, max_depth, time_ms)
+                except Exception:
+                    result = None
+                # A search cut short by cancel() is not worth keeping
+                with self.lock:
+                    if generation != self.generation:
+                        return
+                if result is not None:
+                    key, mirrored = position.canonical_key()
+                    result = result._replace(move=mirror_move(result.move, position.geometry, mirrored))
+                    self.pondered[position.geometry, key] = (max_depth, time_ms, result)
+            position.undo()
+
+
+def lowest_empty_row(position: Position, col: int) -> int:
+    """Row a piece dropped in col would land on (0 is the top), or -1 if full."""
+    if not position.can_play(col):
+        return -1
+    g = position.geometry
+    return g.rows - 1 - (position.heights[col] - col * g.h1)
+
+
+def check_win(position: Position, player: str) -> bool:
+    """Check whether the named player has a winning line."""
+    return position.has_won(PLAYERS.index(player))
+
+
+def winner(position: Position) -> Optional[str]:
+    """Name of the player with a winning line, if any."""
+    for index, name in enumerate(PLAYERS):
+        if position.has_won(index):
+            return name
+    return None
+
+
+def is_draw(position: Position) -> bool:
+    """Check for a full board with no winner."""
+    return position.is_full() and winner(position) is None
+
+
+def to_board(position: Position) -> List[List[Optional[str]]]:
+    """List-of-rows view of a position, top row first, for display."""
+    g = position.geometry
+    board = [[None] * g.cols for _ in range(g.rows)]
+    for r in range(g.rows):
+        for c in range(g.cols):
+            bit = g.cell_bit(g.rows - 1 - r, c)
+            if position.mask & bit:
+                board[r][c] = PLAYERS[0] if position.boards[0] & bit else PLAYERS[1]
+    return board
+
+
+def make_engine(backend: str = "alphabeta", tt_size_mb: float = 16, workers: int = 1, book=None,
+                seed: int = 0, **options) -> Searcher:
+    """Create a search backend by name (see BACKENDS).
+
+    tt_size_mb only applies to alpha-beta; workers is the number of search
+    processes for either backend (0 means all cores). Other options go to
+    the backend's constructor.
+    """
+    if backend == "alphabeta":
+        return SearchEngine(tt_size_mb, workers=workers, book=book, seed=seed, **options)
+    if backend == "mcts":
+        # Imported here since mcts builds on this module
+        from mcts import MCTSEngine
+        return MCTSEngine(workers=workers, book=book, seed=seed, **options)
+    raise ValueError(f"Unknown search backend {backend!r}")
+
+
+# Shared engines of search(), by backend
+_default_engines = {}
+
+
+def search(position: Position, difficulty: str = "hard", max_depth: Optional[int] = None,
+           time_ms: Optional[float] = None) -> SearchResult:
+    """Search a position with a shared engine for the difficulty's backend.
+
+    The depth cap and time budget default to the difficulty's limits;
+    pass max_depth or time_ms to override them.
+    """
+    backend = DIFFICULTY_BACKENDS.get(difficulty, "alphabeta")
+    if backend not in _default_engines:
+        _default_engines[backend] = make_engine(backend)
+    depth_cap, budget = DIFFICULTY_LIMITS[difficulty]
+    return _default_engines[backend].search(position, max_depth or depth_cap, time_ms if time_ms is not None else budget)
@@ -1,9 +1,72 @@
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import filedialog, messagebox
 import math
-import random
-import threading
-from typing import Optional, List, Tuple
+import os
+import time
+from typing import Optional, Tuple
+
+from engine import (
+    BACKENDS, COLS, CONNECT, DIFFICULTY_BACKENDS, DIFFICULTY_LIMITS, ROWS, Position, SearchWorker,
+    check_win, get_geometry, is_draw, lowest_empty_row, make_engine, to_board, winner,
+)
+from game_records import GameRecord, read_records, record_shape, write_records
+from opening_book import OpeningBook
+from position_db import PositionDB
+
+# Piece colors: outer fill, outer outline, middle ring, inner ring, shine
+PIECE_COLORS = {
+    "red": ("#DC2626", "#B91C1C", "#EF4444", "#F87171", "#FCA5A5"),
+    "yellow": ("#EAB308", "#CA8A04", "#FDE047", "#FEF08A", "#FEF3C7"),
+}
+
+# Board sizes offered in the options, as (rows, cols)
+BOARD_SIZES = {"7x6": (6, 7), "8x7": (7, 8), "9x7": (7, 9)}
+WIN_LENGTHS = (4, 5)
+
+# Largest board area in pixels that fits beside the sidebar
+BOARD_MAX_WIDTH = 490
+BOARD_MAX_HEIGHT = 420
+
+# Default frame cap for the drop animation
+DROP_FPS = 60
+# Drop physics, in cell sizes per second (squared) as the board scales
+DROP_GRAVITY = 45.0
+DROP_BOUNCE_MIN_SPEED = 3.5
+DROP_BOUNCE_DAMPING = 0.4
+
+
+def drop_offset(elapsed: float, distance: float, gravity: float, bounce_min_speed: float,
+                damping: float) -> Optional[float]:
+    """Height above its resting place of a falling piece after `elapsed` seconds.
+
+    The piece falls `distance` under `gravity` and bounces back with
+    `damping` of its speed while landing faster than `bounce_min_speed`.
+    Returns None once it has come to rest.
+    """
+    fall_time = math.sqrt(2 * distance / gravity) if distance > 0 else 0.0
+    if elapsed < fall_time:
+        return distance - gravity * elapsed * elapsed / 2
+    elapsed -= fall_time
+    speed = gravity * fall_time
+    while speed > bounce_min_speed:
+        speed *= damping
+        bounce_time = 2 * speed / gravity
+        if elapsed < bounce_time:
+            return speed * elapsed - gravity * elapsed * elapsed / 2
+        elapsed -= bounce_time
+    return None
+
+
+# Per-move search trace written while the debug panel is open
+TRACE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_trace.jsonl")
+
+# Pause before the AI moves; shorter when the reply was already pondered
+AI_MOVE_DELAY_MS = 1200
+PONDER_HIT_DELAY_MS = 150
+
+# Only this difficulty reads and writes the position database: stored
+# results are as deep as it searches, which would strengthen weaker levels
+POSITION_DB_DIFFICULTY = "hard"
 
 class FourInARowCreative:
     def __init__(self, master):
@@ -27,12 +90,12 @@ class FourInARowCreative:
         y = (self.master.winfo_screenheight() // 2) - (600 // 2)
         self.master.geometry(f"800x600+{x}+{y}")
 
-    def initialize_game_state(self):
-        """Initialize all game state variables."""
-        # Board dimensions and sizing (fit within 800x600 alongside sidebar)
-        self.cols = 7
-        self.rows = 6
-        self.cell_size = 70  # 7 * 70 = 490px width, 6 * 70 = 420px height
+    def set_board_geometry(self, rows: int, cols: int, connect: int):
+        """Switch to a board shape and size cells to fit the window."""
+        self.geometry = get_geometry(rows, cols, connect)
+        self.cols = cols
+        self.rows = rows
+        self.cell_size = min(70, BOARD_MAX_WIDTH // cols, BOARD_MAX_HEIGHT // rows)
         self.board_width = self.cols * self.cell_size
         self.board_height = self.rows * self.cell_size
         # Radii for slots/pieces derived from cell size
@@ -42,7 +105,10 @@ class FourInARowCreative:
         self.piece_inner_radius = int(self.cell_size * 0.20)
         self.preview_radius = int(self.cell_size * 0.35)
 
-        self.board = [[None for _ in range(self.cols)] for _ in range(self.rows)]
+    def initialize_game_state(self):
+        """Initialize all game state variables."""
+        self.set_board_geometry(ROWS, COLS, CONNECT)
+        self.position = Position(self.geometry)
         self.current_player = "red"
         self.game_mode = "ai"
         self.difficulty = "hard"
@@ -51,8 +117,28 @@ class FourInARowCreative:
         self.game_active = True
         self.paused = False
         self.animation_in_progress = False
+        # Timer and canvas item of the drop being animated, so a new game can cancel it
+        self.drop_after_id = None
+        self.drop_piece_id = None
         # Track pending AI timer to allow cancellation
         self.pending_ai_after_id = None
+        # One engine per search backend; the difficulty picks which one plays
+        book = OpeningBook.load()
+        self.engines = {backend: make_engine(backend, book=book) for backend in BACKENDS}
+        self.engine = self.engines["alphabeta"]
+        # Hard's results kept across games and runs; None if the file cannot be opened.
+        # No busy timeout: the Tk thread never waits for a tournament writing to it
+        self.position_db = PositionDB.load(timeout=0)
+        # All AI searches run on one worker thread; see cancel_pending_ai
+        self.ai_worker = SearchWorker(self.engine, self.on_ai_result)
+        # Search the player's likely replies while they think
+        self.ponder_enabled = False
+        self.debug_enabled = False
+        # Drop animation: frame cap, and off for fast play or replays
+        self.drop_fps = DROP_FPS
+        self.animate_drops = True
+        # Column under the pointer while the hover items are shown
+        self.hover_col = None
 
     def create_ui(self):
         """Create UI with game board as main focus."""
@@ -69,6 +155,9 @@ class FourInARowCreative:
         # Central game board (main focus)
         self.create_main_game_area(main_container)
 
+        # Search statistics on demand
+        self.master.bind("<F12>", self.toggle_debug_panel)
+
     def create_compact_header(self):
         """Create minimal header."""
         header = tk.Frame(self.master, bg="#0F172A", height=60)
@@ -173,6 +262,19 @@ class FourInARowCreative:
         )
         self.pause_btn.pack(fill="x", pady=3)
 
+        # Save / Load the moves as a game record file
+        files_frame = tk.Frame(controls_frame, bg="#1E293B")
+        files_frame.pack(fill="x", pady=3)
+        file_button_style = dict(button_style, width=7)
+        tk.Button(
+            files_frame, text="💾 Save", command=self.save_game,
+            bg="#0F766E", fg="#F8FAFC", activebackground="#115E59", **file_button_style
+        ).pack(side="left", fill="x", expand=True, padx=(0, 2))
+        tk.Button(
+            files_frame, text="📂 Load", command=self.load_game,
+            bg="#0F766E", fg="#F8FAFC", activebackground="#115E59", **file_button_style
+        ).pack(side="left", fill="x", expand=True, padx=(2, 0))
+
     def create_compact_options(self, parent):
         """Create compact game options."""
         options_frame = tk.Frame(parent, bg="#1E293B")
@@ -197,10 +299,43 @@ class FourInARowCreative:
         
         self.difficulty_var = tk.StringVar(value="hard")
         diff_menu = tk.OptionMenu(options_frame, self.difficulty_var,
-                                 "easy", "medium", "hard", command=self.set_difficulty)
+                                 *DIFFICULTY_LIMITS, command=self.set_difficulty)
         self.style_compact_menu(diff_menu)
         diff_menu.pack(fill="x")
 
+        # Board size and win length
+        tk.Label(options_frame, text="Board", font=("Arial", 8),
+                fg="#CBD5E1", bg="#1E293B").pack(anchor="w", pady=(8, 2))
+
+        board_frame = tk.Frame(options_frame, bg="#1E293B")
+        board_frame.pack(fill="x")
+        self.board_size_var = tk.StringVar(value=f"{COLS}x{ROWS}")
+        size_menu = tk.OptionMenu(board_frame, self.board_size_var,
+                                  *BOARD_SIZES, command=self.set_board_size)
+        self.style_compact_menu(size_menu)
+        size_menu.pack(side="left", fill="x", expand=True)
+        self.connect_var = tk.StringVar(value=f"Connect {CONNECT}")
+        connect_menu = tk.OptionMenu(board_frame, self.connect_var,
+                                     *(f"Connect {n}" for n in WIN_LENGTHS), command=self.set_board_size)
+        self.style_compact_menu(connect_menu)
+        connect_menu.pack(side="left", fill="x", expand=True)
+
+        self.ponder_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            options_frame, text="Think on your time", variable=self.ponder_var,
+            command=self.toggle_pondering, font=("Arial", 8), fg="#CBD5E1", bg="#1E293B",
+            selectcolor="#374151", activebackground="#1E293B", activeforeground="#F8FAFC",
+            highlightthickness=0, bd=0, cursor="hand2"
+        ).pack(anchor="w", pady=(8, 0))
+
+        self.animate_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            options_frame, text="Animate drops", variable=self.animate_var,
+            command=self.toggle_animation, font=("Arial", 8), fg="#CBD5E1", bg="#1E293B",
+            selectcolor="#374151", activebackground="#1E293B", activeforeground="#F8FAFC",
+            highlightthickness=0, bd=0, cursor="hand2"
+        ).pack(anchor="w")
+
     def style_compact_menu(self, menu):
         """Style compact option menus."""
         menu.config(
@@ -233,6 +368,38 @@ class FourInARowCreative:
             fg="#F59E0B", bg="#1E293B"
         )
 
+        # Search debug panel (hidden until F12)
+        self.debug_label = tk.Label(
+            status_frame, text="", font=("Courier", 7),
+            fg="#94A3B8", bg="#1E293B", justify="left", anchor="w"
+        )
+
+    def toggle_debug_panel(self, event=None):
+        """Show or hide search statistics and the per-move trace file."""
+        self.debug_enabled = not self.debug_enabled
+        for engine in self.engines.values():
+            engine.instrument = self.debug_enabled
+            engine.trace_path = TRACE_PATH if self.debug_enabled else None
+        if self.debug_enabled:
+            self.debug_label.config(text="Search stats:\nwaiting for AI move")
+            self.debug_label.pack(fill="x", pady=(5, 0))
+        else:
+            self.debug_label.pack_forget()
+
+    def update_debug_panel(self, result, stats: dict):
+        """Show the counters of the last AI search."""
+        if not self.debug_enabled or result is None:
+            return
+        seconds = result.elapsed_ms / 1000
+        nps = result.nodes / seconds if seconds else 0
+        self.debug_label.config(text=(
+            f"depth {result.depth}  {result.elapsed_ms:.0f} ms\n"
+            f"{result.nodes} nodes {nps / 1000:.1f}k/s\n"
+            f"cut {stats.get('beta_cutoff_rate', 0):.0%}  1st {stats.get('first_move_cutoff_rate', 0):.0%}\n"
+            f"TT hit {stats.get('tt_hit_rate', 0):.0%}  cut {stats.get('tt_cutoffs', 0)}\n"
+            f"eval {stats.get('eval_ms', 0):.0f} ms  gen {stats.get('movegen_ms', 0):.0f} ms"
+        ))
+
     def create_main_game_area(self, parent):
         """Create the main game board area - THE FOCUS."""
         game_area = tk.Frame(parent, bg="#0F172A")
@@ -266,9 +433,14 @@ class FourInARowCreative:
         self.canvas.bind("<Button-1>", self.handle_click)
         self.canvas.bind("<Motion>", self.handle_hover)
         self.canvas.bind("<Leave>", self.clear_hover)
+        self.draw_board()
 
     def draw_board(self):
-        """Draw large, clear game board."""
+        """Draw the board once: background, grid, slots and hidden piece items.
+
+        Pieces are shown and hidden per cell afterwards (show_piece,
+        hide_piece), so moves never redraw the whole canvas.
+        """
         self.canvas.delete("all")
         
         # Draw board background
@@ -293,8 +465,10 @@ class FourInARowCreative:
                 fill="#374151", width=2
             )
         
-        # Draw slots and pieces
+        # Draw slots, each with its (hidden) piece on top
+        self.piece_items = []
         for row in range(self.rows):
+            items = []
             for col in range(self.cols):
                 x = col * self.cell_size + self.cell_size // 2
                 y = row * self.cell_size + self.cell_size // 2
@@ -304,52 +478,54 @@ class FourInARowCreative:
                     x - self.slot_radius, y - self.slot_radius, x + self.slot_radius, y + self.slot_radius,
                     fill="#0F172A", outline="#64748B", width=3
                 )
-                
-                # Draw piece if exists
-                piece = self.board[row][col]
-                if piece:
-                    self.draw_large_piece(x, y, piece)
-
-    def draw_large_piece(self, x: int, y: int, color: str):
-        """Draw large, beautiful game pieces."""
-        if color == "red":
-            # Large red piece with multiple gradients (scaled)
-            self.canvas.create_oval(
-                x - self.piece_outer_radius, y - self.piece_outer_radius, x + self.piece_outer_radius, y + self.piece_outer_radius,
-                fill="#DC2626", outline="#B91C1C", width=4
-            )
-            self.canvas.create_oval(
-                x - self.piece_mid_radius, y - self.piece_mid_radius, x + self.piece_mid_radius, y + self.piece_mid_radius,
-                fill="#EF4444", outline="", width=0
-            )
-            self.canvas.create_oval(
-                x - self.piece_inner_radius, y - self.piece_inner_radius, x + self.piece_inner_radius, y + self.piece_inner_radius,
-                fill="#F87171", outline="", width=0
-            )
-            # Large shine effect
-            self.canvas.create_oval(
-                x - int(self.piece_inner_radius * 0.75), y - self.piece_inner_radius, x - int(self.piece_inner_radius * 0.25), y - int(self.piece_inner_radius * 0.1), 
-                fill="#FCA5A5", outline="", width=0
-            )
-        else:  # yellow
-            # Large yellow piece with multiple gradients (scaled)
-            self.canvas.create_oval(
-                x - self.piece_outer_radius, y - self.piece_outer_radius, x + self.piece_outer_radius, y + self.piece_outer_radius,
-                fill="#EAB308", outline="#CA8A04", width=4
-            )
-            self.canvas.create_oval(
-                x - self.piece_mid_radius, y - self.piece_mid_radius, x + self.piece_mid_radius, y + self.piece_mid_radius,
-                fill="#FDE047", outline="", width=0
-            )
-            self.canvas.create_oval(
-                x - self.piece_inner_radius, y - self.piece_inner_radius, x + self.piece_inner_radius, y + self.piece_inner_radius,
-                fill="#FEF08A", outline="", width=0
-            )
+                items.append(self.create_piece_items(x, y))
+            self.piece_items.append(items)
+
+        board = to_board(self.position)
+        for row in range(self.rows):
+            for col in range(self.cols):
+                if board[row][col]:
+                    self.show_piece(row, col, board[row][col])
+
+        # Column highlight and preview piece, moved around by handle_hover
+        self.hover_col = None
+        self.hover_column_item = self.canvas.create_rectangle(
+            0, 0, 0, 0, fill="#3B82F6", stipple="gray12", state="hidden", tags="hover"
+        )
+        self.hover_preview_item = self.canvas.create_oval(
+            0, 0, 0, 0, outline="#F8FAFC", width=2, state="hidden", tags="hover"
+        )
+
+    def create_piece_items(self, x: int, y: int) -> Tuple[int, int, int, int]:
+        """Create the hidden ovals of one large piece: outer, middle, inner and shine."""
+        def oval(x0, y0, x1, y1, **options):
+            return self.canvas.create_oval(x0, y0, x1, y1, state="hidden", tags="piece", **options)
+
+        return (
+            oval(x - self.piece_outer_radius, y - self.piece_outer_radius, x + self.piece_outer_radius, y + self.piece_outer_radius,
+                 width=4),
+            oval(x - self.piece_mid_radius, y - self.piece_mid_radius, x + self.piece_mid_radius, y + self.piece_mid_radius,
+                 outline="", width=0),
+            oval(x - self.piece_inner_radius, y - self.piece_inner_radius, x + self.piece_inner_radius, y + self.piece_inner_radius,
+                 outline="", width=0),
             # Large shine effect
-            self.canvas.create_oval(
-                x - int(self.piece_inner_radius * 0.75), y - self.piece_inner_radius, x - int(self.piece_inner_radius * 0.25), y - int(self.piece_inner_radius * 0.1),
-                fill="#FEF3C7", outline="", width=0
-            )
+            oval(x - int(self.piece_inner_radius * 0.75), y - self.piece_inner_radius, x - int(self.piece_inner_radius * 0.25), y - int(self.piece_inner_radius * 0.1),
+                 outline="", width=0),
+        )
+
+    def show_piece(self, row: int, col: int, color: str):
+        """Show a red or yellow piece in one cell."""
+        outer, mid, inner, shine = self.piece_items[row][col]
+        fill, outline, mid_fill, inner_fill, shine_fill = PIECE_COLORS[color]
+        self.canvas.itemconfigure(outer, fill=fill, outline=outline, state="normal")
+        self.canvas.itemconfigure(mid, fill=mid_fill, state="normal")
+        self.canvas.itemconfigure(inner, fill=inner_fill, state="normal")
+        self.canvas.itemconfigure(shine, fill=shine_fill, state="normal")
+
+    def hide_piece(self, row: int, col: int):
+        """Empty one cell."""
+        for item in self.piece_items[row][col]:
+            self.canvas.itemconfigure(item, state="hidden")
 
     def handle_click(self, event):
         """Handle clicks on the large board."""
@@ -361,105 +537,100 @@ class FourInARowCreative:
             self.make_move(int(col))
 
     def handle_hover(self, event):
-        """Enhanced hover effects for large board."""
+        """Highlight the column under the pointer and preview the piece."""
         if not self.game_active or self.paused or self.animation_in_progress:
             return
         
         col = event.x // self.cell_size
-        if 0 <= col < self.cols:
-            self.canvas.delete("hover")
-            col = int(col)
-            # Highlight entire column
-            self.canvas.create_rectangle(
-                col * self.cell_size + 2, 2, (col + 1) * self.cell_size - 2, self.board_height - 2,
-                fill="#3B82F6", stipple="gray12", tags="hover"
+        if not 0 <= col < self.cols:
+            self.hide_hover()
+        elif col != self.hover_col:
+            # Items only move when the pointer enters another column
+            self.hover_col = col = int(col)
+            self.canvas.coords(
+                self.hover_column_item,
+                col * self.cell_size + 2, 2, (col + 1) * self.cell_size - 2, self.board_height - 2
             )
-            
-            # Show preview piece at top
             x = col * self.cell_size + self.cell_size // 2
             y = self.cell_size // 2
-            color = "#DC2626" if self.current_player == "red" else "#EAB308"
-            self.canvas.create_oval(
-                x - self.preview_radius, y - self.preview_radius, x + self.preview_radius, y + self.preview_radius,
-                fill=color, outline="#F8FAFC", width=2, tags="hover"
+            self.canvas.coords(
+                self.hover_preview_item,
+                x - self.preview_radius, y - self.preview_radius, x + self.preview_radius, y + self.preview_radius
             )
+            self.canvas.itemconfigure(self.hover_preview_item, fill=PIECE_COLORS[self.current_player][0])
+            self.canvas.itemconfigure("hover", state="normal")
 
     def clear_hover(self, event):
         """Clear hover effects."""
-        self.canvas.delete("hover")
+        self.hide_hover()
+
+    def hide_hover(self):
+        """Hide the column highlight and preview piece."""
+        self.hover_col = None
+        self.canvas.itemconfigure("hover", state="hidden")
 
-    def make_move(self, col: int):
-        """Make a move with enhanced animation."""
+    def make_move(self, col: int, animate: Optional[bool] = None):
+        """Make a move, animated unless animate (default self.animate_drops) is off."""
         if not (0 <= col < self.cols) or self.animation_in_progress:
             return
         
-        row = self.get_lowest_empty_row(col)
+        row = lowest_empty_row(self.position, col)
         if row == -1:
             messagebox.showwarning("Invalid Move", "Column is full!")
             return
         
         self.animation_in_progress = True
-        self.board[row][col] = self.current_player
+        self.position.play(col)
         self.move_history.append((row, col, self.current_player))
         
         # Clear hover effects
-        self.canvas.delete("hover")
+        self.hide_hover()
         
-        # Enhanced animation for large board
-        self.animate_large_piece_drop(row, col, self.current_player)
+        if animate if animate is not None else self.animate_drops:
+            self.animate_large_piece_drop(row, col, self.current_player)
+        else:
+            self.show_piece(row, col, self.current_player)
+            self.animation_in_progress = False
+            self.post_move_logic(row, col)
 
     def animate_large_piece_drop(self, target_row: int, target_col: int, player: str):
-        """Enhanced animation for large pieces."""
+        """Drop a piece into place with a bounce.
+
+        The piece's position follows the time since the drop started, so a
+        frame that comes late skips ahead instead of slowing the drop.
+        Frames are requested at most drop_fps times a second.
+        """
         x = target_col * self.cell_size + self.cell_size // 2
-        start_y = -self.piece_outer_radius
         end_y = target_row * self.cell_size + self.cell_size // 2
-        current_y = start_y
-        velocity = 0
-        gravity = max(2, int(self.cell_size / 35))
+        distance = end_y + self.piece_outer_radius
+        gravity = DROP_GRAVITY * self.cell_size
+        bounce_min_speed = DROP_BOUNCE_MIN_SPEED * self.cell_size
+        frame_ms = max(1, int(1000 / self.drop_fps))
         
         # Colors
-        piece_color = "#DC2626" if player == "red" else "#EAB308"
-        outline_color = "#B91C1C" if player == "red" else "#CA8A04"
+        piece_color, outline_color = PIECE_COLORS[player][:2]
         r = self.piece_outer_radius
         
         # Create large animated piece
         piece_id = self.canvas.create_oval(
-            x - r, current_y - r, x + r, current_y + r,
+            x - r, -2 * r, x + r, 0,
             fill=piece_color, outline=outline_color, width=4
         )
+        self.drop_piece_id = piece_id
+        start = time.perf_counter()
         
         def drop_step():
-            nonlocal current_y, velocity
-            
-            if current_y < end_y:
-                velocity += gravity
-                current_y += velocity
-                
-                if current_y >= end_y:
-                    current_y = end_y
-                    # Bounce effect for scaled pieces
-                    bounce_threshold = max(6, int(self.cell_size / 12))
-                    if velocity > bounce_threshold:
-                        velocity = -int(velocity * 0.4)
-                        current_y = end_y + velocity
-                    else:
-                        velocity = 0
-                
-                self.canvas.coords(
-                    piece_id,
-                    x - r, current_y - r, x + r, current_y + r
-                )
-                
-                if current_y != end_y or velocity != 0:
-                    self.master.after(25, drop_step)
-                else:
-                    self.canvas.delete(piece_id)
-                    self.draw_board()
-                    self.animation_in_progress = False
-                    self.post_move_logic(target_row, target_col)
+            offset = drop_offset(time.perf_counter() - start, distance, gravity,
+                                 bounce_min_speed, DROP_BOUNCE_DAMPING)
+            if offset is not None:
+                y = end_y - offset
+                self.canvas.coords(piece_id, x - r, y - r, x + r, y + r)
+                self.drop_after_id = self.master.after(frame_ms, drop_step)
             else:
+                self.drop_after_id = None
+                self.drop_piece_id = None
                 self.canvas.delete(piece_id)
-                self.draw_board()
+                self.show_piece(target_row, target_col, player)
                 self.animation_in_progress = False
                 self.post_move_logic(target_row, target_col)
         
@@ -467,7 +638,7 @@ class FourInARowCreative:
 
     def post_move_logic(self, row: int, col: int):
         """Handle post-move logic."""
-        if self.check_win(row, col):
+        if check_win(self.position, self.current_player):
             self.scores[self.current_player] += 1
             self.update_scores()
             winner = "Player 1" if self.current_player == "red" else "Player 2"
@@ -478,7 +649,7 @@ class FourInARowCreative:
             self.show_game_end_modal(f"{winner} Wins!")
             return
         
-        if self.check_draw():
+        if is_draw(self.position):
             self.update_status("🤝 Draw!")
             self.game_active = False
             self.cancel_pending_ai()
@@ -493,42 +664,12 @@ class FourInARowCreative:
         # AI move
         if self.game_mode == "ai" and self.current_player == "yellow":
             self.cancel_pending_ai()
-            self.pending_ai_after_id = self.master.after(1200, self.make_ai_move)
-
-    def get_lowest_empty_row(self, col: int) -> int:
-        """Get lowest empty row."""
-        for r in range(self.rows - 1, -1, -1):
-            if self.board[r][col] is None:
-                return r
-        return -1
-
-    def check_win(self, row: int, col: int) -> bool:
-        """Check for win condition."""
-        player = self.board[row][col]
-        
-        # Check all directions
-        directions = [
-            [(0, 1), (0, -1)],    # Horizontal
-            [(1, 0), (-1, 0)],    # Vertical
-            [(1, 1), (-1, -1)],   # Diagonal /
-            [(1, -1), (-1, 1)]    # Diagonal \
-        ]
-        
-        for direction_pair in directions:
-            count = 1  # Current piece
-            for dr, dc in direction_pair:
-                r, c = row + dr, col + dc
-                while 0 <= r < self.rows and 0 <= c < self.cols and self.board[r][c] == player:
-                    count += 1
-                    r, c = r + dr, c + dc
-            if count >= 4:
-                return True
-        
-        return False
-
-    def check_draw(self) -> bool:
-        """Check for draw."""
-        return all(self.board[0][c] is not None for c in range(self.cols))
+            depth, time_ms = self.get_difficulty_limits()
+            pondered = self.ai_worker.pondered_result(self.position, depth, time_ms) is not None
+            delay = PONDER_HIT_DELAY_MS if pondered else AI_MOVE_DELAY_MS
+            self.pending_ai_after_id = self.master.after(delay, self.make_ai_move)
+        elif self.game_mode == "ai" and self.ponder_enabled:
+            self.start_pondering()
 
     def update_status(self, message: str):
         """Update status display."""
@@ -554,21 +695,39 @@ class FourInARowCreative:
         self.reset_game()
 
     def set_difficulty(self, difficulty: str):
-        """Set AI difficulty."""
+        """Set AI difficulty, switching search backend if it uses another one."""
         self.difficulty = difficulty
+        engine = self.engines[DIFFICULTY_BACKENDS.get(difficulty, "alphabeta")]
+        if engine is not self.engine:
+            self.engine = engine
+            self.ai_worker.set_engine(engine)
+        self.reset_game()
+
+    def set_board_size(self, _choice: str):
+        """Start a new game on the board size and win length chosen in the options."""
+        rows, cols = BOARD_SIZES[self.board_size_var.get()]
+        connect = int(self.connect_var.get().split()[-1])
+        self.cancel_pending_ai()
+        self.cancel_drop()
+        self.set_board_geometry(rows, cols, connect)
+        self.position = Position(self.geometry)
+        self.canvas.config(width=self.board_width, height=self.board_height)
+        self.draw_board()
         self.reset_game()
 
     def reset_game(self):
         """Reset game state."""
         self.cancel_pending_ai()
-        self.board = [[None for _ in range(self.cols)] for _ in range(self.rows)]
+        self.cancel_drop()
+        self.position = Position(self.geometry)
+        self.engine.new_game()
         self.current_player = "red"
         self.move_history = []
         self.game_active = True
         self.paused = False
         self.animation_in_progress = False
-        self.canvas.delete("hover")
-        self.draw_board()
+        self.hide_hover()
+        self.canvas.itemconfigure("piece", state="hidden")
         self.update_status("🎯 Player 1's Turn")
 
     def undo_move(self):
@@ -581,14 +740,84 @@ class FourInARowCreative:
         
         last_move = self.move_history.pop()
         row, col, player = last_move
-        self.board[row][col] = None
+        self.position.undo()
         
         self.current_player = "red" if self.current_player == "yellow" else "yellow"
         player_name = "Player 1" if self.current_player == "red" else "Player 2"
         self.update_status(f"🎯 {player_name}'s Turn")
         
         self.game_active = True
-        self.draw_board()
+        self.hide_piece(row, col)
+
+    def save_game(self):
+        """Save the moves played so far as a game record file."""
+        path = filedialog.asksaveasfilename(
+            title="Save Game", defaultextension=".c4r",
+            filetypes=[("Game records", "*.c4r"), ("All files", "*")]
+        )
+        if not path:
+            return
+        result = winner(self.position) or ("draw" if self.position.is_full() else None)
+        depth, time_ms = self.get_difficulty_limits() if self.game_mode == "ai" else (0, 0)
+        record = GameRecord([col for _, col, _ in self.move_history], result,
+                            yellow_depth=depth, yellow_time_ms=time_ms)
+        try:
+            write_records(path, [record], self.rows, self.cols, self.geometry.connect)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Save Game", f"Could not save the game:\n{e}")
+
+    def load_game(self):
+        """Replace the current game with the first game of a record file."""
+        path = filedialog.askopenfilename(
+            title="Load Game", filetypes=[("Game records", "*.c4r"), ("All files", "*")]
+        )
+        if not path:
+            return
+        try:
+            rows, cols, connect = record_shape(path)
+            record = next(read_records(path), None)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Load Game", f"Could not read the game:\n{e}")
+            return
+        size = f"{cols}x{rows}"
+        if record is None or BOARD_SIZES.get(size) != (rows, cols) or connect not in WIN_LENGTHS:
+            messagebox.showerror("Load Game", "The file holds no game for a board this window can show.")
+            return
+
+        if (rows, cols, connect) != (self.rows, self.cols, self.geometry.connect):
+            self.board_size_var.set(size)
+            self.connect_var.set(f"Connect {connect}")
+            self.set_board_size(size)
+        else:
+            self.reset_game()
+        self.replay_moves(record.moves)
+
+    def replay_moves(self, moves):
+        """Play columns on the board without animation, then continue the game from there."""
+        for col in moves:
+            on_board = 0 <= col < self.position.geometry.cols
+            if not on_board or not self.position.can_play(col) or winner(self.position) is not None:
+                break
+            row = lowest_empty_row(self.position, col)
+            self.position.play(col)
+            self.move_history.append((row, col, self.current_player))
+            self.show_piece(row, col, self.current_player)
+            self.current_player = "yellow" if self.current_player == "red" else "red"
+
+        result = winner(self.position)
+        if result is not None:
+            self.game_active = False
+            self.update_status(f"🎉 {'Player 1' if result == 'red' else 'Player 2'} Wins!")
+        elif is_draw(self.position):
+            self.game_active = False
+            self.update_status("🤝 Draw!")
+        else:
+            player_name = "Player 1" if self.current_player == "red" else "Player 2"
+            self.update_status(f"🎯 {player_name}'s Turn")
+            if self.game_mode == "ai" and self.current_player == "yellow":
+                self.pending_ai_after_id = self.master.after(AI_MOVE_DELAY_MS, self.make_ai_move)
+            elif self.game_mode == "ai" and self.ponder_enabled:
+                self.start_pondering()
 
     def toggle_pause(self):
         """Toggle pause state."""
@@ -611,194 +840,71 @@ class FourInARowCreative:
         if not self.game_active or self.paused or self.animation_in_progress or self.current_player != "yellow":
             return
 
-        board_copy = [row[:] for row in self.board]
-        depth = self.get_difficulty_depth()
-
-        def worker():
-            try:
-                best_col = self.minimax(board_copy, depth, True)[0]
-            except Exception:
-                best_col = None
-
-            def apply_move():
-                if not self.game_active or self.paused or self.animation_in_progress or self.current_player != "yellow":
-                    return
-                if best_col is not None:
-                    self.make_move(best_col)
-            self.master.after(0, apply_move)
-
-        threading.Thread(target=worker, daemon=True).start()
-
-    def minimax(self, board: List[List[Optional[str]]], depth: int, maximizing_player: bool, alpha: float = -math.inf, beta: float = math.inf) -> Tuple[Optional[int], int]:
-        """Minimax with alpha-beta pruning and center-first move ordering."""
-        cols = len(board[0])
-        valid_locations = [c for c in range(cols) if self.get_lowest_empty_row_sim(board, c) != -1]
-        is_terminal = self.is_terminal_node(board)
-
-        if depth == 0 or is_terminal:
-            if is_terminal:
-                if self.check_win_sim(board, "yellow"):
-                    return (None, 10_000_000_000)
-                elif self.check_win_sim(board, "red"):
-                    return (None, -10_000_000_000)
-                else:
-                    return (None, 0)
-            else:
-                return (None, self.score_position(board, "yellow"))
-
-        # Order moves: center-first
-        center = cols // 2
-        valid_locations.sort(key=lambda c: abs(center - c))
-
-        if maximizing_player:
-            value = -math.inf
-            best_column = random.choice(valid_locations)
-            for col in valid_locations:
-                row_idx = self.get_lowest_empty_row_sim(board, col)
-                b_copy = [r[:] for r in board]
-                self.drop_piece_sim(b_copy, row_idx, col, "yellow")
-                new_score = self.minimax(b_copy, depth - 1, False, alpha, beta)[1]
-                if new_score > value:
-                    value = new_score
-                    best_column = col
-                alpha = max(alpha, value)
-                if alpha >= beta:
-                    break
-            return best_column, value
-        else:
-            value = math.inf
-            best_column = random.choice(valid_locations)
-            for col in valid_locations:
-                row_idx = self.get_lowest_empty_row_sim(board, col)
-                b_copy = [r[:] for r in board]
-                self.drop_piece_sim(b_copy, row_idx, col, "red")
-                new_score = self.minimax(b_copy, depth - 1, True, alpha, beta)[1]
-                if new_score < value:
-                    value = new_score
-                    best_column = col
-                beta = min(beta, value)
-                if alpha >= beta:
-                    break
-            return best_column, value
-
-    def score_position(self, board: List[List[Optional[str]]], player: str) -> int:
-        """Score board position."""
-        score = 0
-        opponent = "red" if player == "yellow" else "yellow"
-
-        rows = len(board)
-        cols = len(board[0])
-
-        # Center preference
-        center_col = cols // 2
-        center_array = [board[r][center_col] for r in range(rows)]
-        center_count = center_array.count(player)
-        score += center_count * 3
-
-        # Horizontal windows
-        for r in range(rows):
-            row_array = board[r]
-            for c in range(cols - 3):
-                window = row_array[c:c + 4]
-                score += self.evaluate_window(window, player, opponent)
-
-        # Vertical windows
-        for c in range(cols):
-            col_array = [board[r][c] for r in range(rows)]
-            for r in range(rows - 3):
-                window = col_array[r:r + 4]
-                score += self.evaluate_window(window, player, opponent)
-
-        # Diagonal down-right
-        for r in range(rows - 3):
-            for c in range(cols - 3):
-                window = [board[r + i][c + i] for i in range(4)]
-                score += self.evaluate_window(window, player, opponent)
-
-        # Diagonal down-left
-        for r in range(rows - 3):
-            for c in range(3, cols):
-                window = [board[r + i][c - i] for i in range(4)]
-                score += self.evaluate_window(window, player, opponent)
-
-        return score
-
-    def evaluate_window(self, window: List[Optional[str]], player: str, opponent: str) -> int:
-        """Evaluate 4-piece window."""
-        score = 0
-        player_count = window.count(player)
-        empty_count = window.count(None)
-        opponent_count = window.count(opponent)
-
-        if player_count == 4:
-            score += 100
-        elif player_count == 3 and empty_count == 1:
-            score += 5
-        elif player_count == 2 and empty_count == 2:
-            score += 2
-
-        if opponent_count == 3 and empty_count == 1:
-            score -= 4
-
-        return score
-
-    def is_terminal_node(self, board: List[List[Optional[str]]]) -> bool:
-        """Check if terminal state."""
-        return self.check_win_sim(board, "red") or self.check_win_sim(board, "yellow") or self.check_draw_sim(board)
-
-    def check_win_sim(self, board: List[List[Optional[str]]], player: str) -> bool:
-        """Check win in simulation."""
-        rows = len(board)
-        cols = len(board[0])
-        # Horizontal
-        for r in range(rows):
-            for c in range(cols - 3):
-                if all(board[r][col_idx] == player for col_idx in range(c, c + 4)):
-                    return True
-        # Vertical
-        for c in range(cols):
-            for r in range(rows - 3):
-                if all(board[row_idx][c] == player for row_idx in range(r, r + 4)):
-                    return True
-        # Diagonal down-right
-        for r in range(rows - 3):
-            for c in range(cols - 3):
-                if all(board[r + i][c + i] == player for i in range(4)):
-                    return True
-        # Diagonal down-left
-        for r in range(rows - 3):
-            for c in range(3, cols):
-                if all(board[r + i][c - i] == player for i in range(4)):
-                    return True
-        return False
-
-    def check_draw_sim(self, board: List[List[Optional[str]]]) -> bool:
-        """Check draw in simulation."""
-        cols = len(board[0])
-        return all(board[0][c] is not None for c in range(cols))
-
-    def drop_piece_sim(self, board: List[List[Optional[str]]], row: int, col: int, player: str):
-        """Simulate dropping a piece on the board."""
-        board[row][col] = player
-
-    def get_lowest_empty_row_sim(self, board: List[List[Optional[str]]], col: int) -> int:
-        """Get the lowest empty row in a simulated board."""
-        for r in range(len(board) - 1, -1, -1):
-            if board[r][col] is None:
-                return r
-        return -1
-
-    def get_difficulty_depth(self) -> int:
-        """Return minimax depth based on difficulty."""
-        if self.difficulty == "easy":
-            return 2
-        elif self.difficulty == "medium":
-            return 4
+        depth, time_ms = self.get_difficulty_limits()
+        result = self.ai_worker.pondered_result(self.position, depth, time_ms)
+        if result is not None:
+            self.remember_result(result)
+        elif self.uses_position_db():
+            # A stored search as deep as this one would go answers at once
+            result = self.position_db.lookup(self.position, depth)
+        if result is not None:
+            self.update_debug_panel(result, {})
+            self.make_move(result.move)
+            return
+        self.ai_worker.submit(self.position, depth, time_ms)
+
+    def uses_position_db(self) -> bool:
+        """Whether the current difficulty reads and writes the position database."""
+        return self.position_db is not None and self.difficulty == POSITION_DB_DIFFICULTY
+
+    def remember_result(self, result):
+        """Add an AI search of the current position to the position database."""
+        if self.uses_position_db():
+            self.position_db.store(self.position, result)
+
+    def start_pondering(self):
+        """Search the player's possible replies in the background."""
+        depth, time_ms = self.get_difficulty_limits()
+        self.ai_worker.ponder(self.position, depth, time_ms)
+
+    def toggle_animation(self):
+        """Turn the drop animation on or off (off for fast play)."""
+        self.animate_drops = self.animate_var.get()
+
+    def toggle_pondering(self):
+        """Turn thinking on the player's time on or off."""
+        self.ponder_enabled = self.ponder_var.get()
+        waiting_for_player = (self.game_mode == "ai" and self.current_player == "red"
+                              and self.game_active and not self.paused)
+        if not waiting_for_player:
+            return
+        if self.ponder_enabled:
+            self.start_pondering()
         else:
-            return 6  # Hard
+            self.ai_worker.cancel()
+
+    def on_ai_result(self, generation: int, result, stats):
+        """Hand a finished search from the worker thread to the Tk thread."""
+        self.master.after(0, self.apply_ai_result, generation, result, stats)
+
+    def apply_ai_result(self, generation: int, result, stats):
+        """Play the AI's move unless the search was cancelled meanwhile."""
+        if not self.ai_worker.is_current(generation):
+            return
+        self.update_debug_panel(result, stats.as_dict() if stats is not None else {})
+        if not self.game_active or self.paused or self.animation_in_progress or self.current_player != "yellow":
+            return
+        if result is not None and result.move is not None:
+            self.remember_result(result)
+            self.make_move(result.move)
+
+    def get_difficulty_limits(self) -> Tuple[int, int]:
+        """Return (depth cap, time budget in ms) based on difficulty."""
+        return DIFFICULTY_LIMITS.get(self.difficulty, DIFFICULTY_LIMITS["hard"])
 
     def cancel_pending_ai(self):
-        """Cancel any pending AI after callback if exists."""
+        """Cancel the pending AI timer and any search already running."""
+        self.ai_worker.cancel()
         if self.pending_ai_after_id is not None:
             try:
                 self.master.after_cancel(self.pending_ai_after_id)
@@ -807,12 +913,26 @@ class FourInARowCreative:
             finally:
                 self.pending_ai_after_id = None
 
+    def cancel_drop(self):
+        """Stop the drop being animated, if any, and remove its piece."""
+        if self.drop_after_id is not None:
+            self.master.after_cancel(self.drop_after_id)
+            self.drop_after_id = None
+        if self.drop_piece_id is not None:
+            self.canvas.delete(self.drop_piece_id)
+            self.drop_piece_id = None
+
 
 def main():
     """Main function to run the game."""
     root = tk.Tk()
     game = FourInARowCreative(root)
     root.mainloop()
+    game.ai_worker.close()
+    for engine in game.engines.values():
+        engine.close()
+    if game.position_db is not None:
+        game.position_db.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,270 @@
+"""Compact binary game records.
+
+A record file starts with a file header: magic, format version and the
+board's rows, columns and win length. Game records follow. Each one is
+a fixed record header (result, opening length, ply count and both
+sides' engine limits) followed by the moves, packed 3 bits each on
+boards of up to 8 columns and 4 bits each on wider ones.
+
+Files are append-only. RecordWriter sends each record to the OS in a
+single write on a descriptor opened with O_APPEND, so several processes
+can append to one file without interleaving. read_records() is a
+generator that holds one record at a time, so files of millions of
+games stream in constant memory.
+
+Records convert to and from a text notation, one game per line: the
+columns played (1-9, then a-g), the result ("1-0", "0-1", "1/2" or
+"*"), and optional key=value engine fields:
+
+    4453 1-0 opening=2 red=8/300 yellow=5/500
+
+    python game_records.py to-text games.c4r > games.txt
+    python game_records.py from-text games.txt games.c4r
+"""
+
+import argparse
+import os
+import struct
+import sys
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from engine import COLS, CONNECT, PLAYERS, ROWS
+
+RECORD_MAGIC = b"C4GR"
+RECORD_VERSION = 1
+
+# magic, version, rows, cols, win length
+FILE_HEADER = struct.Struct(">4sBBBB")
+# result, opening plies, plies, red depth, red time (ms), yellow depth, yellow time (ms)
+RECORD_HEADER = struct.Struct(">BBHBHBH")
+
+# Results as stored in the record header
+RESULT_CODES = {None: 0, PLAYERS[0]: 1, PLAYERS[1]: 2, "draw": 3}
+RESULTS = {code: result for result, code in RESULT_CODES.items()}
+# ... and as written in the text notation
+RESULT_TEXT = {None: "*", PLAYERS[0]: "1-0", PLAYERS[1]: "0-1", "draw": "1/2"}
+TEXT_RESULTS = {text: result for result, text in RESULT_TEXT.items()}
+
+# Column symbols of the text notation
+COLUMN_SYMBOLS = "123456789abcdefg"
+
+
+class GameRecord(NamedTuple):
+    """One game: columns played (0-based), result and the engines' limits.
+
+    result is "red", "yellow", "draw" or None for an unfinished game.
+    A depth of 0 marks a human player; a time of 0 means no time limit.
+    Depths are stored up to 255 and times up to 65535 ms.
+    """
+    moves: List[int]
+    result: Optional[str] = None
+    opening_plies: int = 0
+    red_depth: int = 0
+    red_time_ms: int = 0
+    yellow_depth: int = 0
+    yellow_time_ms: int = 0
+
+
+def move_bits(cols: int) -> int:
+    """Bits per packed move on a board with this many columns."""
+    if cols > 16:
+        raise ValueError(f"Game records hold at most 16 columns, not {cols}")
+    return 3 if cols <= 8 else 4
+
+
+def pack_record(record: GameRecord, cols: int) -> bytes:
+    """Record header and packed moves of one game on a board with this many columns."""
+    bits = move_bits(cols)
+    packed = 0
+    for col in record.moves:
+        if not 0 <= col < cols:
+            raise ValueError(f"Column {col} is off a {cols}-column board")
+        packed = packed << bits | col
+    # Left-align the moves in whole bytes
+    size = (len(record.moves) * bits + 7) // 8
+    packed <<= size * 8 - len(record.moves) * bits
+    # Depths beyond 255 and times beyond the field's 65 s range are stored as the maximum
+    header = RECORD_HEADER.pack(
+        RESULT_CODES[record.result], record.opening_plies, len(record.moves),
+        min(record.red_depth, 0xFF), min(int(record.red_time_ms), 0xFFFF),
+        min(record.yellow_depth, 0xFF), min(int(record.yellow_time_ms), 0xFFFF),
+    )
+    return header + packed.to_bytes(size, "big")
+
+
+def unpack_moves(data: bytes, plies: int, bits: int) -> List[int]:
+    """Columns packed by pack_record."""
+    packed = int.from_bytes(data, "big") >> (len(data) * 8 - plies * bits)
+    mask = (1 << bits) - 1
+    return [(packed >> (bits * (plies - 1 - i))) & mask for i in range(plies)]
+
+
+class RecordWriter:
+    """Appends game records to a file, creating it with its header if needed.
+
+    Safe to use from several processes at once on the same file.
+    """
+
+    def __init__(self, path: str, rows: int = ROWS, cols: int = COLS, connect: int = CONNECT):
+        self.path = path
+        self.shape = (rows, cols, connect)
+        move_bits(cols)  # Fail before creating the file if the board is too wide
+        header = FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, rows, cols, connect)
+        if not os.path.exists(path):
+            # Publish a complete header in one step; os.link fails if another process won
+            tmp_path = f"{path}.{os.getpid()}.{id(self)}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            try:
+                os.write(fd, header)
+                os.close(fd)
+                os.link(tmp_path, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.unlink(tmp_path)
+        with open(path, "rb") as f:
+            existing = f.read(FILE_HEADER.size)
+        if existing != header:
+            raise ValueError(f"{path} is not a record file for a {cols}x{rows} connect-{connect} board")
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+
+    def write(self, record: GameRecord):
+        """Append one game."""
+        os.write(self.fd, pack_record(record, self.shape[1]))
+
+    def write_all(self, records: Iterable[GameRecord]):
+        """Append every game of an iterable."""
+        for record in records:
+            self.write(record)
+
+    def close(self):
+        """Close the file."""
+        os.close(self.fd)
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_records(path: str, records: Iterable[GameRecord], rows: int = ROWS, cols: int = COLS,
+                  connect: int = CONNECT):
+    """Write a new record file with these games, replacing any file atomically."""
+    move_bits(cols)
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, rows, cols, connect))
+            for record in records:
+                f.write(pack_record(record, cols))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def read_header(f) -> Tuple[int, int, int]:
+    """Check a record file's header and return its (rows, cols, connect)."""
+    data = f.read(FILE_HEADER.size)
+    if len(data) != FILE_HEADER.size:
+        raise ValueError("not a game record file")
+    magic, version, rows, cols, connect = FILE_HEADER.unpack(data)
+    if magic != RECORD_MAGIC or version != RECORD_VERSION:
+        raise ValueError("not a game record file")
+    return rows, cols, connect
+
+
+def read_records(path: str) -> Iterator[GameRecord]:
+    """Yield the games of a record file one at a time.
+
+    A record cut short at the end (a writer that was interrupted) is
+    skipped.
+    """
+    with open(path, "rb") as f:
+        _, cols, _ = read_header(f)
+        bits = move_bits(cols)
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            result, opening, plies, red_depth, red_time, yellow_depth, yellow_time = RECORD_HEADER.unpack(header)
+            data = f.read((plies * bits + 7) // 8)
+            if len(data) < (plies * bits + 7) // 8:
+                return
+            moves = unpack_moves(data, plies, bits)
+            if any(col >= cols for col in moves):
+                raise ValueError(f"Record has a move off the {cols}-column board")
+            yield GameRecord(moves, RESULTS[result], opening,
+                             red_depth, red_time, yellow_depth, yellow_time)
+
+
+def record_shape(path: str) -> Tuple[int, int, int]:
+    """The (rows, cols, connect) of a record file."""
+    with open(path, "rb") as f:
+        return read_header(f)
+
+
+def to_text(record: GameRecord) -> str:
+    """One line of text notation for a game."""
+    fields = ["".join(COLUMN_SYMBOLS[col] for col in record.moves) or "-", RESULT_TEXT[record.result]]
+    if record.opening_plies:
+        fields.append(f"opening={record.opening_plies}")
+    if record.red_depth:
+        fields.append(f"red={record.red_depth}/{record.red_time_ms}")
+    if record.yellow_depth:
+        fields.append(f"yellow={record.yellow_depth}/{record.yellow_time_ms}")
+    return " ".join(fields)
+
+
+def from_text(line: str, cols: int = COLS) -> GameRecord:
+    """Parse a line written by to_text for a board with this many columns."""
+    moves, result, *extra = line.split()
+    symbols = COLUMN_SYMBOLS[:cols]
+    if moves != "-" and any(ch not in symbols for ch in moves.lower()):
+        raise ValueError(f"Moves {moves!r} are not columns 1-{symbols[-1]} of a {cols}-column board")
+    record = GameRecord([] if moves == "-" else [symbols.index(ch) for ch in moves.lower()],
+                        TEXT_RESULTS[result])
+    for field in extra:
+        name, _, value = field.partition("=")
+        if name == "opening":
+            record = record._replace(opening_plies=int(value))
+        elif name in PLAYERS:
+            depth, _, time_ms = value.partition("/")
+            record = record._replace(**{f"{name}_depth": int(depth), f"{name}_time_ms": int(time_ms or 0)})
+        else:
+            raise ValueError(f"Unknown record field {name!r}")
+    return record
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line converter between record files and text notation."""
+    parser = argparse.ArgumentParser(description="Convert Four in a Row game records to and from text.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    to_text_parser = commands.add_parser("to-text", help="print a record file as text, one game per line")
+    to_text_parser.add_argument("records")
+    from_text_parser = commands.add_parser("from-text", help="append games from a text file ('-' for stdin)")
+    from_text_parser.add_argument("text")
+    from_text_parser.add_argument("records")
+    from_text_parser.add_argument("--rows", type=int, default=ROWS, help="board rows")
+    from_text_parser.add_argument("--cols", type=int, default=COLS, help="board columns")
+    from_text_parser.add_argument("--connect", type=int, default=CONNECT, help="pieces in a row needed to win")
+    args = parser.parse_args(argv)
+
+    if args.command == "to-text":
+        for record in read_records(args.records):
+            print(to_text(record))
+        return
+    source = sys.stdin if args.text == "-" else open(args.text)
+    try:
+        with RecordWriter(args.records, args.rows, args.cols, args.connect) as writer:
+            writer.write_all(from_text(line, args.cols) for line in source if line.strip())
+    except ValueError as error:
+        parser.error(str(error))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""Monte Carlo tree search backend.
+
+UCT search over the same positions as the alpha-beta engine, created
+with make_engine("mcts") or picked with the "mcts" difficulty. It needs
+no evaluation function: moves are judged by the results of playouts,
+random games played to the end from the leaves of the tree.
+
+The tree is a node pool of flat arrays indexed by node number, with the
+children of a node stored next to each other, rather than one Python
+object per node. Leaves are selected in batches; with workers > 1 the
+playouts of a batch run across a process pool. With evaluate_leaves set,
+a batch is scored by the static evaluation in one vectorized call
+instead of being played out.
+"""
+
+import math
+import os
+import random
+import time
+from array import array
+from typing import List, Optional, Tuple
+
+from batch_eval import get_batch_evaluator
+from engine import COLS, CONNECT, ROWS, WIN_THRESHOLD, Geometry, Position, Searcher, SearchResult, get_geometry
+
+# Reported scores run from -MCTS_SCORE_SCALE (sure loss) to +MCTS_SCORE_SCALE (sure win)
+MCTS_SCORE_SCALE = 1000
+
+# Node states: game goes on, won by the player who moved into the node, drawn
+OPEN, WON, DRAWN = 0, 1, 2
+
+# Nodes with no parent, and children not yet created
+NO_NODE = -1
+
+# Evaluation score at which an evaluated leaf counts as a 73% (1 / (1 + e^-1)) win
+MCTS_EVAL_SCALE = 20
+
+
+def mcts_score(score: float) -> int:
+    """An alpha-beta score for the player to move on the MCTS_SCORE_SCALE.
+
+    Wins and losses map to the ends of the scale; other scores go through
+    the same logistic that turns evaluated leaves into expected results.
+    """
+    if abs(score) > WIN_THRESHOLD:
+        return MCTS_SCORE_SCALE if score > 0 else -MCTS_SCORE_SCALE
+    return round(math.tanh(score / (2 * MCTS_EVAL_SCALE)) * MCTS_SCORE_SCALE)
+
+
+def playout(boards: List[int], mask: int, moves: int, geometry: Geometry, rng: random.Random,
+            heavy: bool = True) -> float:
+    """Play random moves to the end of the game.
+
+    Returns 1.0 if the player to move at the start wins, 0.0 if they lose
+    and 0.5 for a draw. Light playouts pick any legal move. Heavy ones
+    take an immediate win, block the opponent's and avoid dropping a
+    piece under one of its winning cells, and otherwise pick at random.
+    Works on bare bitboards, without the evaluation kept by Position.
+    """
+    g = geometry
+    bottom_row, board_mask = g.bottom_row, g.board_mask
+    winning_cells, has_line = g.winning_cells, g.has_line
+    current, other = boards[moves & 1], boards[(moves & 1) ^ 1]
+    starter = 1  # 1 while the player who started the playout is to move
+    for _ in range(g.cells - moves):
+        choices = (mask + bottom_row) & board_mask
+        if heavy:
+            if winning_cells(current, mask) & choices:
+                return 1.0 if starter else 0.0
+            threats = winning_cells(other, mask)
+            forced = choices & threats
+            if forced:
+                if forced & (forced - 1):
+                    return 0.0 if starter else 1.0
+                choices = forced
+            else:
+                choices = choices & ~(threats >> 1) or choices
+        bits = []
+        while choices:
+            bit = choices & -choices
+            bits.append(bit)
+            choices ^= bit
+        bit = rng.choice(bits)
+        current |= bit
+        mask |= bit
+        # A heavy playout never misses a win, so only light ones need checking
+        if not heavy and has_line(current):
+            return 1.0 if starter else 0.0
+        current, other = other, current
+        starter ^= 1
+    return 0.5
+
+
+class MCTSEngine(Searcher):
+    """UCT search with random playouts."""
+
+    # Leaves selected per batch and per worker when playouts run in a pool
+    POOL_BATCH = 32
+    # Leaves per batch when they are evaluated rather than played out
+    EVAL_BATCH = 16
+
+    def __init__(self, workers: int = 1, book=None, seed: int = 0, exploration: float = 1.4,
+                 heavy: bool = True, playouts: int = 20000, max_nodes: int = 2_000_000,
+                 evaluate_leaves: bool = False):
+        super().__init__(book)
+        # UCT exploration constant
+        self.exploration = exploration
+        self.heavy = heavy
+        # Score leaves with the static evaluation instead of playouts
+        self.evaluate_leaves = evaluate_leaves
+        # Playouts per search when there is no time budget
+        self.playouts = playouts
+        # Leaves stop being expanded once the pool holds this many nodes
+        self.max_nodes = max_nodes
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # Playouts run in a process pool when workers > 1 (0 means all cores)
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+        self.nodes = 0
+        self.reset_tree()
+
+    def reset_tree(self):
+        """Empty the node pool."""
+        self.parent = array("i")
+        self.move = array("b")
+        self.first_child = array("i")
+        self.child_count = array("b")
+        self.state = array("b")
+        self.visits = array("i")
+        # Sum of playout results for the player who moved into the node
+        self.value = array("d")
+        self.add_node(NO_NODE, -1, OPEN)
+
+    def add_node(self, parent: int, move: int, state: int):
+        """Append a node with no children and no visits."""
+        self.parent.append(parent)
+        self.move.append(move)
+        self.first_child.append(NO_NODE)
+        self.child_count.append(0)
+        self.state.append(state)
+        self.visits.append(0)
+        self.value.append(0.0)
+
+    def new_game(self):
+        """Restart the playout random numbers, so games replay the same way."""
+        self.rng = random.Random(self.seed)
+
+    def search(self, position: Position, max_depth: int, time_ms: Optional[float] = None) -> Optional[SearchResult]:
+        """Run playouts until time_ms runs out, or self.playouts without a budget.
+
+        max_depth caps how many plies below the root the tree grows;
+        playouts always go to the end of the game. The result's nodes are
+        the playouts run, its depth the deepest leaf reached, and its
+        score the best move's average result on the MCTS_SCORE_SCALE (an
+        immediate win scores MCTS_SCORE_SCALE, and a book score is mapped
+        by mcts_score). The position is left as it was passed in.
+        """
+        start = time.perf_counter()
+        self.nodes = 0
+        self.iterations = []
+        result = self.book_move(position, start)
+        if result is not None:
+            return result._replace(score=mcts_score(result.score))
+        g = position.geometry
+        moves = [c for c in g.center_order if position.can_play(c)]
+        if not moves:
+            return None
+        for col in moves:
+            if position.is_winning_move(col):
+                return SearchResult(col, MCTS_SCORE_SCALE, 1, 0, (time.perf_counter() - start) * 1000)
+
+        self.reset_tree()
+        self.expand(0, position)
+        deadline = None if time_ms is None else start + time_ms / 1000
+        if self.evaluate_leaves:
+            batch = self.EVAL_BATCH
+        else:
+            batch = 1 if self.workers == 1 else self.POOL_BATCH * self.workers
+        max_depth = max(1, max_depth)
+        deepest = 0
+        # Selection plays moves on the caller's position; rewind to this length
+        played = len(position.history)
+        while not self.cancelled:
+            leaves, snapshots = [], []
+            for _ in range(batch):
+                leaves.append(self.select(position, max_depth))
+                snapshots.append((position.boards[:], position.mask, position.moves))
+                deepest = max(deepest, len(position.history) - played)
+                position.undo_to(played)
+            self.backpropagate(leaves, self.run_playouts(leaves, snapshots, g))
+            self.nodes += len(leaves)
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if deadline is None and self.nodes >= self.playouts:
+                break
+
+        first, count = self.first_child[0], self.child_count[0]
+        best = max(range(first, first + count), key=self.visits.__getitem__)
+        if not self.visits[best]:
+            return None  # Cancelled before anything was learned
+        average = self.value[best] / self.visits[best]
+        score = round((2 * average - 1) * MCTS_SCORE_SCALE)
+        result = SearchResult(self.move[best], score, deepest, self.nodes, (time.perf_counter() - start) * 1000)
+        self.iterations.append(result)
+        return result
+
+    def expand(self, node: int, position: Position):
+        """Create the children of a node, center columns first.
+
+        When the player to move can win at once, only the winning move is
+        added, since nothing else would be played.
+        """
+        g = position.geometry
+        wins = g.winning_cells(position.boards[position.moves & 1], position.mask) & position.possible()
+        if wins:
+            cols = [(wins.bit_length() - 1) // g.h1]
+            state = WON
+        else:
+            cols = [c for c in g.center_order if position.can_play(c)]
+            state = DRAWN if position.moves + 1 == g.cells else OPEN
+        self.first_child[node] = len(self.parent)
+        self.child_count[node] = len(cols)
+        for col in cols:
+            self.add_node(node, col, state)
+
+    def select(self, position: Position, max_depth: int) -> int:
+        """Walk down the tree by UCT, playing the moves on the position.
+
+        Every node passed gets a visit straight away (a virtual loss), so
+        later selections in the same batch spread over other leaves. A
+        leaf that has been played out before is expanded, unless it ends
+        the game, sits at max_depth or the node pool is full.
+        """
+        parent, first_child, child_count = self.parent, self.first_child, self.child_count
+        visits, value, state, move = self.visits, self.value, self.state, self.move
+        exploration = self.exploration
+        node = 0
+        depth = 0
+        while True:
+            visits[node] += 1
+            if state[node] != OPEN:
+                return node
+            if first_child[node] == NO_NODE:
+                if visits[node] == 1 or depth >= max_depth or len(parent) + position.geometry.cols > self.max_nodes:
+                    return node
+                self.expand(node, position)
+            first = first_child[node]
+            log_visits = math.log(visits[node])
+            best, best_score = first, -1.0
+            for child in range(first, first + child_count[node]):
+                n = visits[child]
+                if not n:
+                    best = child
+                    break
+                score = value[child] / n + exploration * math.sqrt(log_visits / n)
+                if score > best_score:
+                    best, best_score = child, score
+            position.play(move[best])
+            node = best
+            depth += 1
+
+    def run_playouts(self, leaves: List[int], snapshots: List[Tuple[List[int], int, int]],
+                     geometry: Geometry) -> List[float]:
+        """Playout results for the player who moved into each leaf.
+
+        snapshots holds each leaf's (bitboards, mask, move count).
+        Finished leaves score their known result without a playout.
+        """
+        jobs = []
+        results = [0.0] * len(leaves)
+        for index, node in enumerate(leaves):
+            if self.state[node] == WON:
+                results[index] = 1.0
+            elif self.state[node] == DRAWN:
+                results[index] = 0.5
+            else:
+                jobs.append(index)
+        if not jobs:
+            return results
+
+        snapshots = [snapshots[index] for index in jobs]
+        if self.evaluate_leaves:
+            outcomes = self.evaluate(snapshots, geometry)
+        elif self.workers > 1:
+            pool = self.get_pool()
+            shape = (geometry.rows, geometry.cols, geometry.connect)
+            chunk = math.ceil(len(snapshots) / self.workers)
+            futures = [
+                pool.submit(_run_playouts, snapshots[i:i + chunk], shape, self.heavy, self.rng.getrandbits(32))
+                for i in range(0, len(snapshots), chunk)
+            ]
+            outcomes = [outcome for future in futures for outcome in future.result()]
+        else:
+            outcomes = [playout(boards, mask, moves, geometry, self.rng, self.heavy)
+                        for boards, mask, moves in snapshots]
+        # Playouts score for the player to move at the leaf, the other side of its mover
+        for index, outcome in zip(jobs, outcomes):
+            results[index] = 1.0 - outcome
+        return results
+
+    def evaluate(self, snapshots: List[Tuple[List[int], int, int]], geometry: Geometry) -> List[float]:
+        """Static evaluation of leaves as expected results for the player to move."""
+        scores = get_batch_evaluator(geometry).evaluate_bitboards([boards[0] for boards, _, _ in snapshots],
+                                                                  [boards[1] for boards, _, _ in snapshots])
+        # Scores are from red's point of view
+        return [1 / (1 + math.exp((score if moves & 1 else -score) / MCTS_EVAL_SCALE))
+                for score, (_, _, moves) in zip(scores, snapshots)]
+
+    def backpropagate(self, leaves: List[int], results: List[float]):
+        """Add each leaf's result to it and its ancestors, alternating sides."""
+        parent, value = self.parent, self.value
+        for node, result in zip(leaves, results):
+            while node != NO_NODE:
+                value[node] += result
+                result = 1.0 - result
+                node = parent[node]
+
+    def get_pool(self):
+        """Start the playout pool on first use; it is reused for every move."""
+        if self.pool is None:
+            # Imported here so plain engine imports stay fast
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Spawn rather than fork: the GUI calls in from a worker thread
+            context = multiprocessing.get_context("spawn")
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self.pool
+
+    def close(self):
+        """Shut down the playout pool, if one was started."""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+def _run_playouts(snapshots: List[Tuple[List[int], int, int]], shape: Tuple[int, int, int] = (ROWS, COLS, CONNECT),
+                  heavy: bool = True, seed: int = 0) -> List[float]:
+    """Play out a chunk of leaves in a worker process; see playout()."""
+    geometry = get_geometry(*shape)
+    rng = random.Random(seed)
+    return [playout(boards, mask, moves, geometry, rng, heavy) for boards, mask, moves in snapshots]
@@ -0,0 +1,196 @@
+"""Opening book for Four in a Row.
+
+The book is a sorted binary file of (position key, best move, score)
+records behind a small header. It is memory-mapped and searched with a
+binary search, so loading it costs nothing at startup. Keys are
+canonical (see Position.canonical_key), so a position and its mirror
+image share one record.
+
+Build a book offline with the engine itself:
+
+    python opening_book.py --ply 6 --depth 14 --time-ms 3000
+
+With --position-db, every search is also added to a position database
+(see position_db.py), which keeps positions beyond the book's last ply.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from engine import (
+    COLS, CONNECT, ROWS, WIN_SCORE, WIN_THRESHOLD, Position, SearchEngine, get_geometry, mirror_move,
+)
+from position_db import PositionDB, position_entry
+
+BOOK_MAGIC = b"C4BK"
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+
+# magic, rows, cols, win length, ply, record count
+HEADER = struct.Struct(">4sBBBBI")
+# Big-endian keys make the byte order of records match their numeric order
+RECORD = struct.Struct(">QBh")
+KEY_BYTES = 8
+
+# Book scores are stored as int16; wins and losses sit at the ends
+BOOK_WIN = 32000
+
+
+class OpeningBook:
+    """Read-only, memory-mapped opening book."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.rows, self.cols, self.connect, self.ply, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != BOOK_MAGIC or len(self.data) != HEADER.size + self.count * RECORD.size:
+            self.data.close()
+            raise ValueError(f"{path} is not a valid opening book")
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_BOOK_PATH) -> Optional["OpeningBook"]:
+        """Open a book, or return None if it is missing or unreadable."""
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def lookup(self, position: Position) -> Optional[Tuple[int, int]]:
+        """Return (best move, engine score) for a position, or None if not in the book."""
+        g = position.geometry
+        if position.moves > self.ply or (g.rows, g.cols, g.connect) != (self.rows, self.cols, self.connect):
+            return None
+        canonical, mirrored = position.canonical_key()
+        key = canonical.to_bytes(KEY_BYTES, "big")
+        data = self.data
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * RECORD.size
+            record_key = data[offset:offset + KEY_BYTES]
+            if record_key < key:
+                lo = mid + 1
+            elif record_key > key:
+                hi = mid
+            else:
+                _, move, score = RECORD.unpack_from(data, offset)
+                return mirror_move(move, g, mirrored), book_to_engine_score(score)
+        return None
+
+    def close(self):
+        """Release the memory map."""
+        self.data.close()
+
+
+def engine_to_book_score(score: float) -> int:
+    """Squeeze a search score into the book's int16 range."""
+    if score > WIN_THRESHOLD:
+        return BOOK_WIN + min(700, int(WIN_SCORE - score))
+    if score < -WIN_THRESHOLD:
+        return -BOOK_WIN - min(700, int(WIN_SCORE + score))
+    return max(-BOOK_WIN + 1, min(BOOK_WIN - 1, int(score)))
+
+
+def book_to_engine_score(score: int) -> int:
+    """Inverse of engine_to_book_score."""
+    if score >= BOOK_WIN:
+        return WIN_SCORE - (score - BOOK_WIN)
+    if score <= -BOOK_WIN:
+        return -(WIN_SCORE - (-score - BOOK_WIN))
+    return score
+
+
+def write_book(path: str, records: Dict[int, Tuple[int, int]], ply: int, rows: int, cols: int,
+               connect: int = CONNECT):
+    """Write records sorted by key, replacing the file atomically.
+
+    records maps canonical keys to (move for the canonical position, book score).
+    """
+    if not get_geometry(rows, cols, connect).exact_keys:
+        raise ValueError(f"Book keys are 8 bytes, too small for a {cols}x{rows} board")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(BOOK_MAGIC, rows, cols, connect, ply, len(records)))
+        for key in sorted(records):
+            move, score = records[key]
+            f.write(RECORD.pack(key, move, score))
+    os.replace(tmp_path, path)
+
+
+def book_positions(ply: int) -> List[Position]:
+    """Every unfinished position up to the given ply, one per pair of mirror images."""
+    frontier = {Position().canonical_key()[0]: Position()}
+    positions = list(frontier.values())
+    for _ in range(ply):
+        next_frontier = {}
+        for position in frontier.values():
+            for col in position.legal_moves():
+                if position.is_winning_move(col):
+                    continue
+                child = position.copy()
+                child.play(col)
+                next_frontier.setdefault(child.canonical_key()[0], child)
+        frontier = next_frontier
+        positions.extend(frontier.values())
+    return positions
+
+
+def build_book(path: str, ply: int, depth: int, time_ms: Optional[float], tt_size_mb: float = 64,
+               workers: int = 1, position_db: Optional[str] = None, log=sys.stderr):
+    """Search every position up to ply with the engine and write the book.
+
+    With position_db set, the searches are also added to that position
+    store, committed every 100 positions and when the build stops.
+    """
+    engine = SearchEngine(tt_size_mb, workers=workers)
+    db = PositionDB(position_db) if position_db else None
+    positions = book_positions(ply)
+    records = {}
+    entries = []
+    start = time.perf_counter()
+    try:
+        for index, position in enumerate(positions, 1):
+            result = engine.search(position, depth, time_ms)
+            key, mirrored = position.canonical_key()
+            records[key] = (mirror_move(result.move, position.geometry, mirrored), engine_to_book_score(result.score))
+            entries.append(position_entry(position, result))
+            if index % 100 == 0 or index == len(positions):
+                if db is not None:
+                    db.store_many(entries)
+                entries = []
+                if log is not None:
+                    elapsed = time.perf_counter() - start
+                    print(f"{index}/{len(positions)} positions, {elapsed:.0f}s", file=log)
+    finally:
+        engine.close()
+        if db is not None:
+            db.store_many(entries)
+            db.close()
+    write_book(path, records, ply, ROWS, COLS, CONNECT)
+    if log is not None:
+        print(f"Wrote {len(records)} positions to {path}", file=log)
+        print(f"Transposition table: {engine.table.stats()}", file=log)
+
+
+def main():
+    """Command-line entry point for building a book."""
+    parser = argparse.ArgumentParser(description="Build the Four in a Row opening book.")
+    parser.add_argument("--ply", type=int, default=4, help="deepest ply stored in the book")
+    parser.add_argument("--depth", type=int, default=14, help="search depth cap per position")
+    parser.add_argument("--time-ms", type=float, default=3000, help="search time per position (0 for no limit)")
+    parser.add_argument("--tt-mb", type=float, default=64, help="transposition table size in MB")
+    parser.add_argument("--workers", type=int, default=1, help="search processes (0 for all cores)")
+    parser.add_argument("--output", default=DEFAULT_BOOK_PATH, help="book file to write")
+    parser.add_argument("--position-db", help="also add every search to this position database")
+    args = parser.parse_args()
+    build_book(args.output, args.ply, args.depth, args.time_ms or None, args.tt_mb, args.workers,
+               args.position_db)
+
+
+if __name__ == "__main__":
+    main()
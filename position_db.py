@@ -0,0 +1,195 @@
+"""Persistent store of analyzed positions.
+
+Search results outlive the game that produced them: every position an
+engine has analyzed is kept with its best move, score and search depth,
+keyed by board shape and canonical position key, so a position and its
+mirror image share one row (moves are stored for the canonical one).
+Before searching on the hard difficulty, the GUI asks the store for an
+answer at least as deep as the search it would run. The tournament and
+the opening-book builder add their searches.
+
+The store is a SQLite database, whose primary-key index makes a lookup
+a single B-tree probe. It runs in WAL mode, so reads never wait for a
+writer. Tournament worker processes each insert their games' searches
+in one transaction, waiting for each other up to a busy timeout. The
+GUI opens the store with no timeout: writes that find it locked are
+kept and retried with the next one, so the interface never waits.
+
+    python tournament.py hard medium --position-db positions.db
+    python position_db.py positions.db        # summary
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from engine import WIN_THRESHOLD, Position, SearchResult, mirror_move
+
+DEFAULT_POSITION_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "positions.db")
+
+# rows, cols, connect, key, move, score, depth; see sql_key for the key
+Entry = Tuple[int, int, int, object, int, int, int]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    connect INTEGER NOT NULL,
+    key INTEGER NOT NULL,
+    move INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (rows, cols, connect, key)
+) WITHOUT ROWID
+"""
+
+# A deeper search replaces a shallower one; hits are kept either way
+UPSERT = """
+INSERT INTO positions (rows, cols, connect, key, move, score, depth) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (rows, cols, connect, key) DO UPDATE
+SET move = excluded.move, score = excluded.score, depth = excluded.depth
+WHERE excluded.depth >= positions.depth
+"""
+
+
+def sql_key(key: int):
+    """A position key as SQLite stores it: an integer if it fits in 63 bits, else big-endian bytes."""
+    if key < 1 << 63:
+        return key
+    return key.to_bytes((key.bit_length() + 7) // 8, "big")
+
+
+def position_entry(position: Position, result: SearchResult) -> Optional[Entry]:
+    """The row for a search result of a position, or None if it is not worth keeping.
+
+    Book answers (depth 0) and searches cancelled before a move are skipped.
+    """
+    if result is None or result.move is None or result.depth < 1:
+        return None
+    g = position.geometry
+    key, mirrored = position.canonical_key()
+    return g.rows, g.cols, g.connect, sql_key(key), mirror_move(result.move, g, mirrored), int(result.score), result.depth
+
+
+class PositionDB:
+    """Analyzed positions in a SQLite file, shared between processes and runs."""
+
+    def __init__(self, path: str = DEFAULT_POSITION_DB_PATH, timeout: float = 30.0):
+        self.path = path
+        # Writes that found the database locked, for the next flush()
+        self.pending_entries: List[Entry] = []
+        self.pending_hits: Counter = Counter()
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the database consistent without a sync per commit
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(SCHEMA)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_POSITION_DB_PATH, timeout: float = 30.0) -> Optional["PositionDB"]:
+        """Open or create a store, or return None if that fails."""
+        try:
+            return cls(path, timeout)
+        except (OSError, sqlite3.Error):
+            return None
+
+    def lookup(self, position: Position, min_depth: int = 0) -> Optional[SearchResult]:
+        """A stored result at least min_depth deep, or one that is exact.
+
+        A result that reaches the end of the game (depth of at least the
+        empty cells left, as from the endgame solver) or proves a win is
+        exact and answers any depth. The result has no nodes and counts
+        a hit for the position.
+        """
+        start = time.perf_counter()
+        g = position.geometry
+        key, mirrored = position.canonical_key()
+        shape_key = (g.rows, g.cols, g.connect, sql_key(key))
+        try:
+            row = self.connection.execute(
+                "SELECT move, score, depth FROM positions WHERE rows = ? AND cols = ? AND connect = ? AND key = ?",
+                shape_key,
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None  # Locked, with no time to wait: search instead
+        if row is None:
+            return None
+        move, score, depth = row
+        move = mirror_move(move, g, mirrored)
+        min_depth = min(min_depth, g.cells - position.moves)
+        if (depth < min_depth and abs(score) <= WIN_THRESHOLD) or not position.can_play(move):
+            return None
+        self.pending_hits[shape_key] += 1
+        self.flush()
+        return SearchResult(move, score, depth, 0, (time.perf_counter() - start) * 1000)
+
+    def store(self, position: Position, result: SearchResult):
+        """Keep a search result for a position."""
+        entry = position_entry(position, result)
+        if entry is not None:
+            self.store_many([entry])
+
+    def store_many(self, entries: Iterable[Optional[Entry]]):
+        """Keep many results in one transaction; None entries are skipped."""
+        self.pending_entries.extend(entry for entry in entries if entry is not None)
+        self.flush()
+
+    def flush(self) -> bool:
+        """Write pending results and hits; False if the database stayed locked.
+
+        What could not be written is kept for the next call.
+        """
+        if not self.pending_entries and not self.pending_hits:
+            return True
+        try:
+            with self.connection:
+                self.connection.executemany(UPSERT, self.pending_entries)
+                self.connection.executemany(
+                    "UPDATE positions SET hits = hits + ? WHERE rows = ? AND cols = ? AND connect = ? AND key = ?",
+                    [(count, *shape_key) for shape_key, count in self.pending_hits.items()],
+                )
+        except sqlite3.OperationalError:
+            return False
+        self.pending_entries = []
+        self.pending_hits.clear()
+        return True
+
+    def summary(self) -> List[Dict]:
+        """Position count, hits and depth range per board shape."""
+        rows = self.connection.execute(
+            "SELECT rows, cols, connect, COUNT(*), SUM(hits), MIN(depth), MAX(depth) FROM positions "
+            "GROUP BY rows, cols, connect"
+        ).fetchall()
+        return [{"rows": r, "cols": c, "connect": n, "positions": count, "hits": hits,
+                 "min_depth": low, "max_depth": high} for r, c, n, count, hits, low, high in rows]
+
+    def close(self, timeout: float = 1.0):
+        """Write what is pending, waiting up to timeout seconds for the lock, and close."""
+        self.connection.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+        self.flush()
+        self.connection.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    """Print a summary of a position store."""
+    parser = argparse.ArgumentParser(description="Summarize a Four in a Row position database.")
+    parser.add_argument("path", nargs="?", default=DEFAULT_POSITION_DB_PATH, help="database file")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} does not exist")
+    db = PositionDB(args.path)
+    try:
+        for shape in db.summary():
+            print(f"{shape['cols']}x{shape['rows']} connect {shape['connect']}: {shape['positions']} positions, "
+                  f"{shape['hits']} hits, depth {shape['min_depth']}-{shape['max_depth']}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
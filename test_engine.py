@@ -0,0 +1,131 @@
+"""Regression tests for the search engine."""
+
+import random
+
+import pytest
+
+import batch_eval
+from batch_eval import BatchEvaluator
+from engine import EndgameSolver, Position, SearchEngine, get_geometry, mirror_move
+
+
+def play(geometry, moves):
+    position = Position(geometry)
+    for col in moves:
+        position.play(col)
+    return position
+
+
+def random_positions(geometry, games=20, seed=1):
+    """Every position of some random games, built move by move."""
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(games):
+        position = Position(geometry)
+        while not position.is_full() and not position.last_move_won():
+            position.play(rng.choice(position.legal_moves()))
+            positions.append(position.copy())
+    return positions
+
+
+def grid(position):
+    """Rows of 0 empty, 1 red, 2 yellow, top row first."""
+    g = position.geometry
+    red, yellow = position.boards
+    return [[1 if red & g.cell_bit(row, col) else 2 if yellow & g.cell_bit(row, col) else 0
+             for col in range(g.cols)] for row in reversed(range(g.rows))]
+
+
+def test_wide_board_keys_do_not_collide():
+    # On 9x7 the key has 72 bits. These positions only swap the owners of
+    # bits 0 and 61, which folding modulo 2^61 - 1 used to map to one key.
+    geometry = get_geometry(7, 9, 4)
+    a = play(geometry, [7, 7, 7, 7, 7, 0, 7])
+    b = play(geometry, [7, 7, 7, 7, 7, 7, 0])
+    assert a.key() != b.key()
+    assert a.canonical_key() != b.canonical_key()
+
+    for depth in (3, 4):
+        fresh = SearchEngine().search(a, depth).score
+        engine = SearchEngine()
+        engine.search(b, depth)
+        assert engine.search(a, depth).score == fresh
+
+
+@pytest.mark.parametrize("shape", [(6, 7, 4), (7, 9, 4), (7, 8, 5), (5, 5, 3)])
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_batch_scores_match_scalar_evaluator(monkeypatch, shape, vectorized):
+    if vectorized and batch_eval.np is None:
+        pytest.skip("NumPy is not installed")
+    if not vectorized:
+        monkeypatch.setattr(batch_eval, "np", None)
+    geometry = get_geometry(*shape)
+    evaluator = BatchEvaluator(geometry)
+    assert evaluator.vectorized == vectorized
+    positions = random_positions(geometry)
+    expected = [position.score for position in positions]
+    assert evaluator.evaluate_positions(positions) == expected
+    assert evaluator.evaluate_grids([grid(position) for position in positions]) == expected
+
+
+@pytest.mark.parametrize("shape", [(6, 7, 4), (7, 9, 4), (7, 8, 5)])
+def test_mirror_images_share_a_canonical_key(shape):
+    geometry = get_geometry(*shape)
+    for position in random_positions(geometry, games=5):
+        mirror = play(geometry, [geometry.cols - 1 - col for col in position.history])
+        key, mirrored = position.canonical_key()
+        mirror_key, mirror_mirrored = mirror.canonical_key()
+        assert key == mirror_key == min(position.key(), mirror.key())
+        if position.key() == mirror.key():
+            continue  # Symmetric: both are the canonical position
+        assert mirrored != mirror_mirrored
+        # A move stored for the canonical position maps back to the same move in each image
+        for col in position.legal_moves():
+            stored = mirror_move(col, geometry, mirrored)
+            assert mirror_move(stored, geometry, mirror_mirrored) == geometry.cols - 1 - col
+
+
+def test_mirror_image_search_reuses_the_table():
+    geometry = get_geometry(6, 7, 4)
+    position = play(geometry, [3, 2, 4, 4, 1])
+    mirror = play(geometry, [geometry.cols - 1 - col for col in position.history])
+    engine = SearchEngine()
+    result = engine.search(position, 6)
+    assert engine.search(mirror, 6).score == result.score == SearchEngine().search(mirror, 6).score
+
+
+def brute_force(position, memo):
+    """Exact solver score by plain negamax over the whole tree."""
+    key = position.key()
+    if key not in memo:
+        g = position.geometry
+        legal = position.legal_moves()
+        if position.last_move_won():
+            memo[key] = -((g.cells + 2 - position.moves) // 2)
+        elif any(position.is_winning_move(col) for col in legal):
+            memo[key] = (g.cells + 1 - position.moves) // 2
+        elif not legal:
+            memo[key] = 0
+        else:
+            best = -g.cells
+            for col in legal:
+                position.play(col)
+                best = max(best, -brute_force(position, memo))
+                position.undo()
+            memo[key] = best
+    return memo[key]
+
+
+@pytest.mark.parametrize("shape", [(4, 4, 3), (4, 5, 3), (5, 4, 3), (4, 4, 4)])
+def test_endgame_solver_matches_brute_force(shape):
+    geometry = get_geometry(*shape)
+    memo = {}
+    positions = [Position(geometry)] + [p for p in random_positions(geometry, games=10) if not p.last_move_won()]
+    for position in positions:
+        if position.is_full():
+            continue
+        expected = brute_force(position, memo)
+        move, score = EndgameSolver().best_move(position)
+        assert score == expected
+        position.play(move)
+        assert -brute_force(position, memo) == expected
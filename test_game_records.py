@@ -0,0 +1,27 @@
+"""Round-trip tests for the game record format."""
+
+import pytest
+
+from game_records import GameRecord, from_text, read_records, to_text, write_records
+
+
+@pytest.mark.parametrize("cols", [7, 9, 16])
+def test_records_round_trip(tmp_path, cols):
+    path = str(tmp_path / "games.c4r")
+    records = [
+        GameRecord(list(range(cols)) + [cols - 1, 0], "red", 2, 300, 70000, 5, 500),
+        GameRecord([], "draw"),
+    ]
+    write_records(path, records, 6, cols, 4)
+    expected = [records[0]._replace(red_depth=255, red_time_ms=0xFFFF), records[1]]
+    assert list(read_records(path)) == expected
+    assert [from_text(to_text(record), cols) for record in expected] == expected
+
+
+@pytest.mark.parametrize("cols", [7, 9, 16])
+def test_records_reject_columns_off_the_board(tmp_path, cols):
+    with pytest.raises(ValueError):
+        write_records(str(tmp_path / "games.c4r"), [GameRecord([3, cols, 3], "red")], 6, cols, 4)
+    if cols < 16:
+        with pytest.raises(ValueError):
+            from_text("4" + "123456789abcdefg"[cols] + " 1-0", cols)
@@ -0,0 +1,276 @@
+"""Headless self-play tournaments between engine configurations.
+
+Each configuration is a difficulty name ("easy", "medium", "hard",
+"mcts") or a spec such as "depth=8,time=300" or "backend=mcts,time=500".
+MCTS specs can add "leaves=eval" to score leaves with the static
+evaluation instead of playouts.
+Every pair of configurations plays the requested number of games,
+alternating colors, across a process pool. Results stream to stdout as
+JSON lines, one per game, followed by one summary line per pairing and
+per configuration:
+
+    python tournament.py hard medium --games 200 --workers 8
+    python tournament.py hard medium --rows 7 --cols 9   # larger board
+    python tournament.py hard mcts --games 20            # alpha-beta against MCTS
+    python tournament.py hard medium --records games.c4r # also append the games to a record file
+    python tournament.py hard medium --position-db positions.db  # keep the alpha-beta searches
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+from engine import (
+    BACKENDS, COLS, CONNECT, DIFFICULTY_BACKENDS, DIFFICULTY_LIMITS, PLAYERS, ROWS, Geometry, Position, Searcher,
+    get_geometry, make_engine, winner,
+)
+from game_records import COLUMN_SYMBOLS, GameRecord, RecordWriter
+from position_db import PositionDB, position_entry
+
+# z for a two-sided 95% interval
+Z_95 = 1.959964
+
+
+def parse_config(spec: str) -> Dict:
+    """Turn a difficulty name or "depth=D,time=T,backend=B,leaves=L" spec into a config dict."""
+    if spec in DIFFICULTY_LIMITS:
+        depth, time_ms = DIFFICULTY_LIMITS[spec]
+        return {"name": spec, "depth": depth, "time_ms": time_ms,
+                "backend": DIFFICULTY_BACKENDS.get(spec, "alphabeta"), "options": {}}
+    config = {"name": spec, "depth": 42, "time_ms": None, "backend": "alphabeta", "options": {}}
+    for part in spec.split(","):
+        field, _, value = part.partition("=")
+        if field == "depth":
+            config["depth"] = int(value)
+        elif field == "time":
+            config["time_ms"] = float(value)
+        elif field == "backend":
+            if value not in BACKENDS:
+                raise ValueError(f"Unknown search backend {value!r} in {spec!r}")
+            config["backend"] = value
+        elif field == "leaves" and value in ("eval", "playout"):
+            config["options"]["evaluate_leaves"] = value == "eval"
+        else:
+            raise ValueError(f"Unknown engine setting {field!r} in {spec!r}")
+    if config["options"] and config["backend"] != "mcts":
+        raise ValueError(f"leaves= needs backend=mcts in {spec!r}")
+    return config
+
+
+def random_opening(rng: random.Random, plies: int, geometry: Optional[Geometry] = None) -> List[int]:
+    """Random opening moves that neither win nor allow an immediate win."""
+    position = Position(geometry)
+    moves = []
+    for _ in range(plies):
+        candidates = [col for col in position.legal_moves() if not position.is_winning_move(col)]
+        safe = []
+        for col in candidates:
+            position.play(col)
+            if not position.can_win_next():
+                safe.append(col)
+            position.undo()
+        col = rng.choice(safe or candidates)
+        position.play(col)
+        moves.append(col)
+    return moves
+
+
+# Engines are kept per worker process and config, so tables survive between games
+_engines: Dict[str, Searcher] = {}
+# Position stores opened by this worker process, by path
+_position_dbs: Dict[str, PositionDB] = {}
+
+
+def play_game(game_id: int, red: Dict, yellow: Dict, opening: List[int], tt_size_mb: float,
+              shape: Tuple[int, int, int] = (ROWS, COLS, CONNECT), position_db: Optional[str] = None) -> Dict:
+    """Play one game on a board of shape (rows, cols, connect) and return its record.
+
+    With position_db set, the alpha-beta searches of the game are added
+    to that position store in one transaction at the end. Engines never
+    read from it, so results do not depend on earlier runs.
+    """
+    position = Position(get_geometry(*shape))
+    for col in opening:
+        position.play(col)
+    configs = (red, yellow)
+    stats = {config["name"]: {"nodes": 0, "time_ms": 0.0, "moves": 0} for config in configs}
+    moves = list(opening)
+    for config in configs:
+        if config["name"] not in _engines:
+            _engines[config["name"]] = make_engine(config["backend"], tt_size_mb, **config["options"])
+        _engines[config["name"]].new_game()
+
+    entries = []
+    result = None
+    while result is None:
+        config = configs[position.current]
+        engine = _engines[config["name"]]
+        search = engine.search(position, config["depth"], config["time_ms"])
+        if position_db and config["backend"] == "alphabeta":
+            entries.append(position_entry(position, search))
+        stats[config["name"]]["nodes"] += search.nodes
+        stats[config["name"]]["time_ms"] += search.elapsed_ms
+        stats[config["name"]]["moves"] += 1
+        position.play(search.move)
+        moves.append(search.move)
+        result = winner(position) or ("draw" if position.is_full() else None)
+
+    if position_db:
+        if position_db not in _position_dbs:
+            _position_dbs[position_db] = PositionDB(position_db)
+        _position_dbs[position_db].store_many(entries)
+
+    return {
+        "type": "game",
+        "game": game_id,
+        "red": red["name"],
+        "yellow": yellow["name"],
+        "result": result,
+        "winner": None if result == "draw" else configs[PLAYERS.index(result)]["name"],
+        "plies": len(moves),
+        "moves": "".join(COLUMN_SYMBOLS[col] for col in moves),
+        "stats": stats,
+    }
+
+
+def game_record(game: Dict, red: Dict, yellow: Dict, opening_plies: int) -> GameRecord:
+    """Binary game record of a game returned by play_game."""
+    return GameRecord(
+        [COLUMN_SYMBOLS.index(ch) for ch in game["moves"]], game["result"], opening_plies,
+        red["depth"], int(red["time_ms"] or 0), yellow["depth"], int(yellow["time_ms"] or 0),
+    )
+
+
+def wilson_interval(successes: int, trials: int, z: float = Z_95) -> Tuple[float, float]:
+    """Wilson score interval for a binomial proportion."""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denom = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denom
+    half = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def summarize_pair(first: str, second: str, games: List[Dict]) -> Dict:
+    """Win/draw/loss rates for first against second, with 95% intervals."""
+    played = [g for g in games if {g["red"], g["yellow"]} == {first, second}]
+    n = len(played)
+    wins = sum(1 for g in played if g["winner"] == first)
+    losses = sum(1 for g in played if g["winner"] == second)
+    draws = n - wins - losses
+    summary = {"type": "pair", "engine": first, "opponent": second, "games": n,
+               "wins": wins, "draws": draws, "losses": losses}
+    for label, count in (("win", wins), ("draw", draws), ("loss", losses)):
+        summary[f"{label}_rate"] = count / n if n else 0.0
+        summary[f"{label}_ci95"] = wilson_interval(count, n)
+    # Score (win = 1, draw = 0.5) with a normal-approximation interval
+    if n:
+        outcomes = [1.0 if g["winner"] == first else 0.0 if g["winner"] == second else 0.5 for g in played]
+        mean = sum(outcomes) / n
+        var = sum((x - mean) ** 2 for x in outcomes) / (n - 1) if n > 1 else 0.0
+        half = Z_95 * math.sqrt(var / n)
+        summary["score"] = mean
+        summary["score_ci95"] = (max(0.0, mean - half), min(1.0, mean + half))
+    return summary
+
+
+def summarize_engine(name: str, games: List[Dict]) -> Dict:
+    """Search speed of one configuration over all its games."""
+    nodes = sum(g["stats"][name]["nodes"] for g in games if name in g["stats"])
+    time_ms = sum(g["stats"][name]["time_ms"] for g in games if name in g["stats"])
+    moves = sum(g["stats"][name]["moves"] for g in games if name in g["stats"])
+    return {
+        "type": "engine", "engine": name, "moves": moves, "nodes": nodes,
+        "nodes_per_sec": nodes / (time_ms / 1000) if time_ms else 0.0,
+        "avg_move_ms": time_ms / moves if moves else 0.0,
+    }
+
+
+def run_tournament(configs: List[Dict], games: int, workers: int, opening_plies: int, seed: int,
+                   tt_size_mb: float, out=sys.stdout,
+                   shape: Tuple[int, int, int] = (ROWS, COLS, CONNECT),
+                   records: Optional[str] = None, position_db: Optional[str] = None) -> List[Dict]:
+    """Play every pairing and stream one JSON line per game, then summaries.
+
+    With records set, every game is also appended to that record file.
+    With position_db set, the alpha-beta searches go to that position store.
+    """
+    rng = random.Random(seed)
+    geometry = get_geometry(*shape)
+    jobs = []
+    for first, second in combinations(configs, 2):
+        for index in range(games):
+            # Each opening is played twice, once with each side starting
+            if index % 2 == 0:
+                opening = random_opening(rng, opening_plies, geometry)
+                jobs.append((first, second, opening))
+            else:
+                jobs.append((second, first, opening))
+
+    results = []
+    writer = RecordWriter(records, *shape) if records else None
+    with ProcessPoolExecutor(max_workers=workers or None) as pool:
+        futures = [pool.submit(play_game, game_id, red, yellow, opening, tt_size_mb, shape, position_db)
+                   for game_id, (red, yellow, opening) in enumerate(jobs)]
+        for future in as_completed(futures):
+            record = future.result()
+            results.append(record)
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            if writer is not None:
+                red, yellow, _ = jobs[record["game"]]
+                writer.write(game_record(record, red, yellow, opening_plies))
+    if writer is not None:
+        writer.close()
+
+    summaries = [summarize_pair(a["name"], b["name"], results) for a, b in combinations(configs, 2)]
+    summaries += [summarize_engine(config["name"], results) for config in configs]
+    for summary in summaries:
+        out.write(json.dumps(summary) + "\n")
+    out.flush()
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Run a headless Four in a Row engine tournament.")
+    parser.add_argument("configs", nargs="+", help='difficulty names or specs like "depth=8,time=300"')
+    parser.add_argument("--games", type=int, default=100, help="games per pairing")
+    parser.add_argument("--workers", type=int, default=0, help="game processes (0 for all cores)")
+    parser.add_argument("--opening-plies", type=int, default=2, help="random moves before the engines take over")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the random openings")
+    parser.add_argument("--tt-mb", type=float, default=16, help="transposition table size per engine in MB")
+    parser.add_argument("--rows", type=int, default=ROWS, help="board rows")
+    parser.add_argument("--cols", type=int, default=COLS, help="board columns")
+    parser.add_argument("--connect", type=int, default=CONNECT, help="pieces in a row needed to win")
+    parser.add_argument("--records", help="append every game to this binary record file")
+    parser.add_argument("--position-db", help="add the alpha-beta searches to this position database")
+    args = parser.parse_args(argv)
+
+    configs = [parse_config(spec) for spec in args.configs]
+    if len(configs) < 2 or len({c["name"] for c in configs}) != len(configs):
+        parser.error("need at least two distinct engine configurations")
+    try:
+        geometry = get_geometry(args.rows, args.cols, args.connect)
+    except ValueError as e:
+        parser.error(str(e))
+    if geometry.cols > len(COLUMN_SYMBOLS):
+        parser.error(f"--cols can be at most {len(COLUMN_SYMBOLS)}")
+    if not 0 <= args.opening_plies < geometry.cols * 2:
+        parser.error("--opening-plies is out of range")
+    start = time.perf_counter()
+    run_tournament(configs, args.games, args.workers, args.opening_plies, args.seed, args.tt_mb,
+                   shape=(args.rows, args.cols, args.connect), records=args.records,
+                   position_db=args.position_db)
+    print(f"Finished in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
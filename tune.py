@@ -0,0 +1,242 @@
+"""Tune the evaluation weights on self-play positions (Texel's method).
+
+The pipeline runs headless, in three steps:
+
+1. Self-play games between two copies of an engine configuration,
+   started from random openings, across a process pool. Games can be
+   saved to a binary record file and reused by later runs.
+2. Every quiet position of those games (the player to move has no
+   immediate win) is labelled with the game's result for red. Its
+   features are computed across the pool with the batch evaluator. The
+   evaluation is linear in its weights, so feature i is the position's
+   score with weight i set to 1 and every other weight set to 0.
+3. Positions with equal features are merged. The loss is the mean
+   squared error between each result and the logistic of the score.
+   The logistic scale is fitted to the current weights first. Each
+   weight then moves up or down one step while that lowers the loss,
+   until no step helps.
+
+The tuned weights are written as JSON, which the engine loads at startup:
+
+    python tune.py --games 4000 --workers 0                 # writes weights.json
+    python tune.py --games 200 --output /tmp/weights.json
+    python tune.py --games 4000 --save-records games.c4r    # keep the games
+    python tune.py --records games.c4r                      # tune on saved games
+
+three and opponent_three only enter the evaluation as three -
+opponent_three, and four only scores finished games, so by default only
+three, two and center are tuned.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from batch_eval import get_batch_evaluator
+from engine import (
+    COLS, CONNECT, DEFAULT_WEIGHTS_PATH, PLAYERS, ROWS, WEIGHTS, EvalWeights, Position, get_geometry,
+)
+from game_records import GameRecord, RecordWriter, read_records, record_shape
+from tournament import game_record, parse_config, play_game, random_opening
+
+# Weights tuned unless --params says otherwise
+TUNED_PARAMS = ("three", "two", "center")
+
+# Labelled position: (red bitboard, yellow bitboard, result for red)
+Sample = Tuple[int, int, float]
+# Merged samples with equal features: features -> [count, sum of results, sum of squared results]
+Rows = Dict[Tuple[int, ...], List[float]]
+
+
+def self_play(config: Dict, games: int, opening_plies: int, seed: int, workers: int,
+              tt_size_mb: float = 16, log=sys.stderr) -> List[GameRecord]:
+    """Play games of a configuration against itself across a process pool."""
+    rng = random.Random(seed)
+    openings = [random_opening(rng, opening_plies) for _ in range(games)]
+    records = []
+    with ProcessPoolExecutor(max_workers=workers or None) as pool:
+        futures = [pool.submit(play_game, index, config, config, opening, tt_size_mb)
+                   for index, opening in enumerate(openings)]
+        for index, future in enumerate(futures, 1):
+            records.append(game_record(future.result(), config, config, opening_plies))
+            if log is not None and (index % 100 == 0 or index == games):
+                print(f"{index}/{games} games", file=log)
+    return records
+
+
+def game_samples(record: GameRecord) -> List[Sample]:
+    """Quiet positions of a finished game, labelled with its result for red."""
+    if record.result is None:
+        return []
+    result = {"draw": 0.5, PLAYERS[0]: 1.0, PLAYERS[1]: 0.0}[record.result]
+    position = Position()
+    samples = []
+    for col in record.moves:
+        position.play(col)
+        if position.last_move_won() or position.is_full() or position.can_win_next():
+            continue
+        samples.append((position.boards[0], position.boards[1], result))
+    return samples
+
+
+def unit_weights() -> List[EvalWeights]:
+    """One set of weights per field, with that field 1 and the rest 0."""
+    zero = EvalWeights(*[0] * len(EvalWeights._fields))
+    return [zero._replace(**{field: 1}) for field in EvalWeights._fields]
+
+
+def sample_features(samples: Sequence[Sample], shape: Tuple[int, int, int] = (ROWS, COLS, CONNECT)) -> Rows:
+    """Merged feature rows of a chunk of samples; runs in a worker process."""
+    reds = [red for red, _, _ in samples]
+    yellows = [yellow for _, yellow, _ in samples]
+    columns = [get_batch_evaluator(get_geometry(*shape, weights)).evaluate_bitboards(reds, yellows)
+               for weights in unit_weights()]
+    rows: Rows = {}
+    for features, (_, _, result) in zip(zip(*columns), samples):
+        row = rows.setdefault(features, [0, 0.0, 0.0])
+        row[0] += 1
+        row[1] += result
+        row[2] += result * result
+    return rows
+
+
+def build_rows(samples: List[Sample], workers: int, chunk: int = 20000) -> Rows:
+    """Features of every sample, computed across a process pool and merged."""
+    rows: Rows = {}
+    with ProcessPoolExecutor(max_workers=workers or None) as pool:
+        parts = pool.map(sample_features, [samples[i:i + chunk] for i in range(0, len(samples), chunk)])
+        for part in parts:
+            for features, (count, total, squares) in part.items():
+                row = rows.setdefault(features, [0, 0.0, 0.0])
+                row[0] += count
+                row[1] += total
+                row[2] += squares
+    return rows
+
+
+def loss(rows: Rows, weights: Sequence[int], scale: float) -> float:
+    """Mean squared error between results and the logistic of the score."""
+    error = 0.0
+    samples = 0
+    for features, (count, total, squares) in rows.items():
+        score = sum(w * f for w, f in zip(weights, features))
+        predicted = 1 / (1 + math.exp(max(-500.0, min(500.0, -score / scale))))
+        # sum over the row of (result - predicted)^2
+        error += squares - 2 * predicted * total + count * predicted * predicted
+        samples += count
+    return error / samples if samples else 0.0
+
+
+def fit_scale(rows: Rows, weights: Sequence[int], low: float = 1.0, high: float = 1000.0) -> float:
+    """Logistic scale (score per unit of log-odds) that best fits the results."""
+    # Golden-section search on log(scale); the loss is unimodal in practice
+    a, b = math.log(low), math.log(high)
+    ratio = (math.sqrt(5) - 1) / 2
+    for _ in range(40):
+        c, d = b - ratio * (b - a), a + ratio * (b - a)
+        if loss(rows, weights, math.exp(c)) < loss(rows, weights, math.exp(d)):
+            b = d
+        else:
+            a = c
+    return math.exp((a + b) / 2)
+
+
+def tune(rows: Rows, weights: EvalWeights, scale: float, params: Sequence[str] = TUNED_PARAMS,
+         max_passes: int = 100, log=sys.stderr) -> EvalWeights:
+    """Move each tuned weight by one while that lowers the loss (Texel's local search)."""
+    current = list(weights)
+    best = loss(rows, current, scale)
+    indexes = [EvalWeights._fields.index(param) for param in params]
+    for passes in range(1, max_passes + 1):
+        improved = False
+        for index in indexes:
+            for step in (1, -1):
+                current[index] += step
+                value = loss(rows, current, scale)
+                if value < best:
+                    best = value
+                    improved = True
+                    break
+                current[index] -= step
+        if log is not None:
+            print(f"pass {passes}: loss {best:.6f} {EvalWeights(*current)}", file=log)
+        if not improved:
+            break
+    return EvalWeights(*current)
+
+
+def write_weights(path: str, weights: EvalWeights, info: Optional[Dict] = None):
+    """Write weights as JSON, replacing the file atomically."""
+    data = dict(weights._asdict())
+    if info:
+        data["tuning"] = info
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Tune the Four in a Row evaluation weights on self-play games.")
+    parser.add_argument("--games", type=int, default=1000, help="self-play games")
+    parser.add_argument("--engine", default="depth=6,time=100", help='engine that plays the games, e.g. "medium"')
+    parser.add_argument("--opening-plies", type=int, default=6, help="random moves at the start of each game")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the random openings")
+    parser.add_argument("--workers", type=int, default=0, help="processes (0 for all cores)")
+    parser.add_argument("--params", default=",".join(TUNED_PARAMS), help="comma-separated weights to tune")
+    parser.add_argument("--holdout", type=float, default=0.1, help="share of games kept out to validate")
+    parser.add_argument("--output", default=DEFAULT_WEIGHTS_PATH, help="weights file to write")
+    parser.add_argument("--records", help="tune on the games of this record file instead of playing new ones")
+    parser.add_argument("--save-records", help="append the self-play games to this record file")
+    args = parser.parse_args(argv)
+
+    params = args.params.split(",")
+    if any(param not in EvalWeights._fields for param in params):
+        parser.error(f"--params must be among {', '.join(EvalWeights._fields)}")
+    config = parse_config(args.engine)
+
+    start = time.perf_counter()
+    if args.records:
+        if record_shape(args.records) != (ROWS, COLS, CONNECT):
+            parser.error(f"{args.records} is not for the standard {COLS}x{ROWS} board")
+        records = list(read_records(args.records))
+    else:
+        records = self_play(config, args.games, args.opening_plies, args.seed, args.workers)
+        if args.save_records:
+            with RecordWriter(args.save_records) as writer:
+                writer.write_all(records)
+    # Split by game, since positions of one game are strongly correlated
+    held = int(len(records) * args.holdout)
+    train = [sample for record in records[held:] for sample in game_samples(record)]
+    test = [sample for record in records[:held] for sample in game_samples(record)]
+    train_rows = build_rows(train, args.workers)
+    test_rows = build_rows(test, args.workers) if test else {}
+    print(f"{len(train)} training positions in {len(train_rows)} distinct rows, "
+          f"{len(test)} held out ({time.perf_counter() - start:.0f}s)", file=sys.stderr)
+
+    scale = fit_scale(train_rows, WEIGHTS)
+    before = (loss(train_rows, WEIGHTS, scale), loss(test_rows, WEIGHTS, scale))
+    print(f"scale {scale:.2f}, loss {before[0]:.6f} (held out {before[1]:.6f}) with {WEIGHTS}", file=sys.stderr)
+    tuned = tune(train_rows, WEIGHTS, scale, params)
+    after = (loss(train_rows, tuned, scale), loss(test_rows, tuned, scale))
+    print(f"loss {after[0]:.6f} (held out {after[1]:.6f}) with {tuned}", file=sys.stderr)
+
+    write_weights(args.output, tuned, {
+        "games": len(records), "positions": len(train), "scale": scale,
+        "engine": args.records or config["name"],
+        "loss_before": before[0], "loss_after": after[0],
+        "holdout_loss_before": before[1], "holdout_loss_after": after[1],
+    })
+    print(f"Wrote {args.output} ({time.perf_counter() - start:.0f}s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()